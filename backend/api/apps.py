@@ -5,3 +5,9 @@ class ApiConfig(AppConfig):
     """Конфигурация для приложения API."""
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        """Подключает обработчики сигналов соединений с базой
+        и сброса кэша токенов."""
+        import api.authentication  # noqa: F401
+        import api.db  # noqa: F401
@@ -0,0 +1,83 @@
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.urls import URLPattern
+
+from .db import check_connections, release_connections
+
+ASYNC_ROUTES = (
+    'recipes-list',
+    'recipes-detail',
+    'tags-list',
+    'tags-detail',
+    'ingredients-list',
+    'ingredients-detail',
+    'recipes-download-shopping-cart',
+)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Пул потоков для представлений, создается при первом запросе."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.SERVER_THREADS,
+                thread_name_prefix='view'
+            )
+        return _executor
+
+
+def call_view(view, request, *args, **kwargs):
+    """Выполняет представление и отрисовывает ответ в потоке пула."""
+    close_old_connections()
+    check_connections()
+    try:
+        response = view(request, *args, **kwargs)
+        if callable(getattr(response, 'render', None)):
+            response = response.render()
+        return response
+    finally:
+        close_old_connections()
+        release_connections()
+
+
+def threaded(view):
+    """Асинхронная обертка над синхронным представлением.
+
+    В Django 3.2 нет асинхронных ORM и кэша, а синхронные представления
+    под ASGI выполняются по очереди в одном общем потоке. Обертка
+    отдает запрос в пул из SERVER_THREADS потоков, и запросы одного
+    воркера обслуживаются параллельно.
+    """
+    async def async_view(request, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            get_executor(),
+            functools.partial(call_view, view, request, *args, **kwargs)
+        )
+
+    async_view.csrf_exempt = getattr(view, 'csrf_exempt', False)
+    return functools.wraps(view)(async_view)
+
+
+def threaded_patterns(patterns, names=ASYNC_ROUTES):
+    """Заменяет представления маршрутов из names асинхронными."""
+    return [
+        URLPattern(
+            pattern.pattern,
+            threaded(pattern.callback),
+            pattern.default_args,
+            pattern.name
+        )
+        if isinstance(pattern, URLPattern) and pattern.name in names
+        else pattern
+        for pattern in patterns
+    ]
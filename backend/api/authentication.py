@@ -0,0 +1,200 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils.translation import gettext_lazy as _
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from users.models import User
+
+
+# Поля пользователя, которые передаются в токене доступа и хранятся
+# в кэше токенов, чтобы аутентификация обходилась без запроса к базе.
+CLAIM_FIELDS = (
+    'username', 'email', 'first_name', 'last_name',
+    'is_active', 'is_staff', 'is_superuser',
+)
+
+
+def token_cache_key(key):
+    """Ключ кэша для токена; сам токен в ключ не попадает."""
+    return 'auth:token:' + hashlib.sha256(key.encode()).hexdigest()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Аутентификация по токену с кэшированием пользователя.
+
+    Поля пользователя из CLAIM_FIELDS хранятся в кэше
+    TOKEN_CACHE_TIMEOUT секунд, и запрос к authtoken_token выполняется
+    только при промахе. Хэш пароля в кэш не попадает. Выход, смена
+    пароля и блокировка пользователя удаляют запись из кэша сразу.
+    """
+
+    def authenticate_credentials(self, key):
+        """Возвращает пользователя из кэша или из базы."""
+        if not settings.TOKEN_CACHE_TIMEOUT:
+            return super().authenticate_credentials(key)
+        cache_key = token_cache_key(key)
+        fields = cache.get(cache_key)
+        if fields is None:
+            user, token = super().authenticate_credentials(key)
+            fields = {field: getattr(user, field) for field in CLAIM_FIELDS}
+            fields['id'] = user.id
+            cache.set(
+                cache_key, fields, timeout=settings.TOKEN_CACHE_TIMEOUT
+            )
+            return user, token
+        user = user_from_fields(fields)
+        return user, Token(key=key, user=user)
+
+
+def forget_tokens(*keys):
+    """Удаляет пользователей токенов из кэша."""
+    cache.delete_many([token_cache_key(key) for key in keys])
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    """Выход из системы удаляет токен."""
+    forget_tokens(instance.key)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, update_fields=None, **kwargs):
+    """Смена пароля, блокировка и другие изменения пользователя."""
+    if created or update_fields and set(update_fields) <= {'last_login'}:
+        return
+    forget_tokens(*Token.objects.filter(user=instance).values_list(
+        'key', flat=True
+    ))
+
+
+def access_for(refresh, user):
+    """Токен доступа с полями пользователя для refresh-токена."""
+    access = refresh.access_token
+    access['iat'] = time.time()
+    for field in CLAIM_FIELDS:
+        access[field] = getattr(user, field)
+    return access
+
+
+def issue_tokens(user):
+    """Пара токенов для входа: refresh и доступа."""
+    refresh = RefreshToken.for_user(user)
+    refresh['iat'] = time.time()
+    return refresh, access_for(refresh, user)
+
+
+def user_from_fields(fields):
+    """Пользователь из словаря полей без запроса к базе.
+
+    Остальные поля отложены и загрузятся из базы при обращении.
+    """
+    # from_db ждет значения в порядке полей модели.
+    names = [
+        field.attname for field in User._meta.concrete_fields
+        if field.attname in fields
+    ]
+    return User.from_db(
+        DEFAULT_DB_ALIAS, names, [fields[name] for name in names]
+    )
+
+
+def user_from_claims(token):
+    """Пользователь из полей токена без запроса к базе."""
+    claims = {field: token[field] for field in CLAIM_FIELDS}
+    claims['id'] = token['user_id']
+    return user_from_fields(claims)
+
+
+def revoked_key(jti):
+    return f'auth:revoked:{jti}'
+
+
+def revoked_before_key(user_id):
+    return f'auth:revoked-before:{user_id}'
+
+
+def revoke_token(token):
+    """Отзывает токен до истечения его срока."""
+    timeout = int(token['exp'] - time.time()) + 1
+    if timeout > 0:
+        cache.set(revoked_key(token['jti']), True, timeout=timeout)
+
+
+def revoke_user_tokens(user_id):
+    """Отзывает все выданные пользователю токены."""
+    cache.set(
+        revoked_before_key(user_id), time.time(),
+        timeout=int(settings.SIMPLE_JWT[
+            'REFRESH_TOKEN_LIFETIME'
+        ].total_seconds())
+    )
+
+
+def is_revoked(token):
+    """Отозван ли токен: одно обращение к кэшу, без базы."""
+    keys = revoked_key(token['jti']), revoked_before_key(token['user_id'])
+    found = cache.get_many(keys)
+    return keys[0] in found or token.get('iat', 0) < found.get(keys[1], 0)
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """Аутентификация по подписанному токену доступа.
+
+    Подпись и срок проверяются без базы, пользователь собирается
+    из полей токена, отзыв проверяется по списку в кэше. Заголовок
+    без JWT пропускается для аутентификации по старому токену.
+    """
+
+    def authenticate(self, request):
+        """Проверяет токен из заголовка Authorization."""
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None or raw_token.count(b'.') != 2:
+            return None
+        token = self.get_validated_token(raw_token)
+        if is_revoked(token):
+            raise InvalidToken(_('Token is blacklisted'))
+        return self.get_user(token), token
+
+    def get_user(self, validated_token):
+        """Пользователь из полей токена."""
+        try:
+            user = user_from_claims(validated_token)
+        except KeyError:
+            raise InvalidToken(
+                _('Token contained no recognizable user identification')
+            )
+        if not user.is_active:
+            raise InvalidToken(_('User is inactive'))
+        return user
+
+
+# Поля, при изменении которых выданные JWT отзываются: права
+# в токене доступа берутся из его полей, а не из базы.
+CREDENTIAL_FIELDS = ('password', 'is_active', 'is_staff', 'is_superuser')
+
+
+@receiver(pre_save, sender=User)
+def user_credentials_changed(sender, instance, update_fields=None,
+                             **kwargs):
+    """Смена пароля, блокировка и изменение прав отзывают выданные JWT."""
+    if settings.AUTH_MODE != 'jwt' or instance._state.adding:
+        return
+    if update_fields and not set(CREDENTIAL_FIELDS) & set(update_fields):
+        return
+    if not User.objects.filter(pk=instance.pk, **{
+        field: getattr(instance, field) for field in CREDENTIAL_FIELDS
+    }).exists():
+        revoke_user_tokens(instance.pk)
@@ -0,0 +1,138 @@
+import logging
+import os
+import random
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.signals import request_finished, request_started
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+connection_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def count(event, alias):
+    """Увеличивает счетчик события соединения с базой."""
+    with _stats_lock:
+        connection_stats[(event, alias)] += 1
+        return connection_stats[(event, alias)]
+
+
+def connection_events():
+    """Снимок счетчиков событий соединений: [((событие, база), число)]."""
+    with _stats_lock:
+        return sorted(connection_stats.items())
+
+
+@receiver(connection_created)
+def connection_opened(sender, connection, **kwargs):
+    """Считает новые соединения: частые открытия означают,
+    что постоянные соединения не переиспользуются."""
+    total = count('opened', connection.alias)
+    logger.debug(
+        'Открыто соединение с базой %s, pid %s, всего %s',
+        connection.alias, os.getpid(), total
+    )
+
+
+def check_connections():
+    """Закрывает постоянные соединения, которые перестали отвечать.
+
+    Проверяются только соединения, простоявшие без дела дольше
+    DB_HEALTH_CHECK_INTERVAL секунд: их обычно и обрывает сервер
+    или пулер, а проверка каждого запроса стоила бы лишнего запроса.
+    """
+    now = time.monotonic()
+    for connection in connections.all():
+        if connection.connection is None:
+            continue
+        released = getattr(connection, 'released_at', now)
+        if now - released < settings.DB_HEALTH_CHECK_INTERVAL:
+            continue
+        if not connection.is_usable():
+            count('unusable', connection.alias)
+            connection.close()
+
+
+def release_connections():
+    """Запоминает, когда соединения освободились после запроса."""
+    now = time.monotonic()
+    for connection in connections.all():
+        if connection.connection is not None:
+            connection.released_at = now
+
+
+@receiver(request_started)
+def request_started_check(**kwargs):
+    """Проверка соединений в начале запроса."""
+    check_connections()
+
+
+@receiver(request_finished)
+def request_finished_release(**kwargs):
+    """Отметка об освобождении соединений в конце запроса."""
+    release_connections()
+
+
+read_from_replica = ContextVar('read_from_replica', default=False)
+
+
+class ReplicaRouter:
+    """Направляет чтение на реплики, когда это разрешил запрос.
+
+    Запись и чтение вне безопасных запросов идут в основную базу.
+    """
+
+    def db_for_read(self, model, **hints):
+        """Реплика для чтения или основная база."""
+        if read_from_replica.get() and settings.DB_REPLICA_ALIASES:
+            return random.choice(settings.DB_REPLICA_ALIASES)
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        """Запись всегда в основную базу, даже для объектов с реплики."""
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        """Реплики содержат те же данные, что и основная база."""
+        return True
+
+
+@contextmanager
+def primary_reads():
+    """Временно читает из основной базы."""
+    token = read_from_replica.set(False)
+    try:
+        yield
+    finally:
+        read_from_replica.reset(token)
+
+
+def sticky_key(user):
+    return f'replica:sticky:{user.pk}'
+
+
+def mark_write(user):
+    """Запоминает запись пользователя: следующие
+    REPLICA_STICKY_SECONDS секунд он читает из основной базы."""
+    if user.is_authenticated and settings.DB_REPLICA_ALIASES:
+        cache.set(
+            sticky_key(user), True,
+            timeout=settings.REPLICA_STICKY_SECONDS
+        )
+
+
+def can_read_replica(user):
+    """Можно ли читать с реплики без риска не увидеть свою запись."""
+    if not settings.DB_REPLICA_ALIASES:
+        return False
+    return user.is_anonymous or not cache.get(sticky_key(user))
@@ -1,13 +1,17 @@
+from django.db.models import Exists, OuterRef
 from rest_framework.filters import SearchFilter
 from django_filters.rest_framework import filters, FilterSet
 
-from recipes.models import Recipe, Ingredient, Tag, Favorite, ShoppingCart
+from recipes.models import (
+    RECIPE_ORDERINGS, Recipe, Ingredient, Tag, Favorite, ShoppingCart
+)
 
 
 CHOICES_LIST = (
     ('0', 'False'),
     ('1', 'True')
 )
+ORDERING_CHOICES = tuple((mode, mode) for mode in RECIPE_ORDERINGS)
 
 
 class RecipesFilter(FilterSet):
@@ -29,6 +33,11 @@ class RecipesFilter(FilterSet):
         to_field_name='slug',
         queryset=Tag.objects.all()
     )
+    search = filters.CharFilter(method='search_method')
+    ordering = filters.ChoiceFilter(
+        method='ordering_method',
+        choices=ORDERING_CHOICES
+    )
 
     class Meta:
         model = Recipe
@@ -36,26 +45,33 @@ class RecipesFilter(FilterSet):
 
     def is_favorited_method(self, queryset, name, value):
         """Метод сортировки избранного."""
-        if self.request.user.is_anonymous:
-            return Recipe.objects.none()
-
-        favorites = Favorite.objects.filter(user=self.request.user)
-        recipes = [item.recipe.id for item in favorites]
-        if value == '1':
-            return queryset.filter(id__in=recipes)
-        if value == '0':
-            return queryset.exclude(id__in=recipes)
+        return self.filter_by_user_list(queryset, Favorite, value)
 
     def is_in_shopping_cart_method(self, queryset, name, value):
         """Метод сортировки списка покупок."""
+        return self.filter_by_user_list(queryset, ShoppingCart, value)
+
+    def filter_by_user_list(self, queryset, model, value):
+        """Отбирает рецепты из списка пользователя одним запросом."""
         if self.request.user.is_anonymous:
             return Recipe.objects.none()
-        shopping_chart = ShoppingCart.objects.filter(user=self.request.user)
-        recipes = [item.recipe.id for item in shopping_chart]
+        in_list = Exists(model.objects.filter(
+            user=self.request.user,
+            recipe=OuterRef('pk')
+        ))
         if value == '1':
-            return queryset.filter(id__in=recipes)
-        if value == '0':
-            return queryset.exclude(id__in=recipes)
+            return queryset.filter(in_list)
+        return queryset.exclude(in_list)
+
+    def search_method(self, queryset, name, value):
+        """Метод поиска по названию, описанию и ингредиентам."""
+        if not value.strip():
+            return queryset
+        return queryset.search(value.strip())
+
+    def ordering_method(self, queryset, name, value):
+        """Метод сортировки: popular, newest, quickest или trending."""
+        return queryset.sort_by(value)
 
 
 class IngredientSearchFilter(SearchFilter):
@@ -0,0 +1,296 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse
+
+from .db import connection_events
+from .query_detector import QueryDetector
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10
+)
+UNMATCHED_VIEW = '<unmatched>'
+
+_metrics_lock = threading.Lock()
+_counters = defaultdict(float)
+_histograms = defaultdict(lambda: [0] * (len(DURATION_BUCKETS) + 1))
+_durations = defaultdict(float)
+
+
+class RequestStats:
+    """Замеры одного запроса.
+
+    Запросы к базе считаются отдельно для каждой фазы: все, что
+    выполнено во время сериализации, попадает в фазу serialize.
+    """
+
+    def __init__(self, detector=None):
+        self.detector = detector
+        self.started = time.perf_counter()
+        self.view = None
+        self.queries = defaultdict(int)
+        self.query_time = defaultdict(float)
+        self.phase_time = defaultdict(float)
+        self.phase = 'view'
+        self.threads = set()
+
+    def __call__(self, execute, sql, params, many, context):
+        """Обертка выполнения SQL для connection.execute_wrapper."""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries[self.phase] += 1
+            self.query_time[self.phase] += time.perf_counter() - started
+
+    @contextmanager
+    def capture(self):
+        """Считает запросы всех баз, выполненные в текущем потоке."""
+        thread = threading.get_ident()
+        if thread in self.threads:
+            yield
+            return
+        self.threads.add(thread)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(self))
+                    if self.detector is not None:
+                        stack.enter_context(
+                            connection.execute_wrapper(self.detector)
+                        )
+                yield
+        finally:
+            self.threads.discard(thread)
+
+    @contextmanager
+    def measure(self, phase):
+        """Замеряет время фазы и относит к ней запросы к базе."""
+        previous, self.phase = self.phase, phase
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phase_time[phase] += time.perf_counter() - started
+            self.phase = previous
+
+    def timed(self, phase, function):
+        """Оборачивает function замером фазы."""
+        def wrapper(*args, **kwargs):
+            with self.measure(phase):
+                return function(*args, **kwargs)
+        return wrapper
+
+    def summary(self, request, response):
+        """Итоги запроса в виде словаря для логов и метрик."""
+        return {
+            'view': self.view or UNMATCHED_VIEW,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'duration_ms': round(
+                (time.perf_counter() - self.started) * 1000, 2
+            ),
+            'db_queries': sum(self.queries.values()),
+            'db_ms': round(sum(self.query_time.values()) * 1000, 2),
+            'serialize_ms': round(self.phase_time['serialize'] * 1000, 2),
+            'serialize_db_queries': self.queries['serialize'],
+            'serialize_db_ms': round(
+                self.query_time['serialize'] * 1000, 2
+            ),
+            'response_bytes': response_size(response),
+        }
+
+
+def response_size(response):
+    """Размер тела ответа, для потоковых ответов неизвестен."""
+    if response.streaming:
+        return None
+    return len(response.content)
+
+
+def server_timing(record):
+    """Значение заголовка Server-Timing."""
+    return ', '.join((
+        f'db;dur={record["db_ms"]};desc="{record["db_queries"]} queries"',
+        f'serialize;dur={record["serialize_ms"]}',
+        f'serialize-db;dur={record["serialize_db_ms"]};'
+        f'desc="{record["serialize_db_queries"]} queries"',
+        f'total;dur={record["duration_ms"]}',
+    ))
+
+
+def record_metrics(record):
+    """Добавляет запрос в метрики процесса."""
+    view = record['view']
+    seconds = record['duration_ms'] / 1000
+    with _metrics_lock:
+        _counters[(
+            'requests_total', view, record['method'], record['status']
+        )] += 1
+        _counters[('db_queries_total', view)] += record['db_queries']
+        _counters[('db_seconds_total', view)] += record['db_ms'] / 1000
+        _counters[('serialize_seconds_total', view)] += (
+            record['serialize_ms'] / 1000
+        )
+        _counters[('serialize_db_queries_total', view)] += (
+            record['serialize_db_queries']
+        )
+        _counters[('response_bytes_total', view)] += (
+            record['response_bytes'] or 0
+        )
+        _histograms[view][bisect_left(DURATION_BUCKETS, seconds)] += 1
+        _durations[view] += seconds
+
+
+def labels(**values):
+    return '{' + ','.join(
+        f'{key}="{value}"' for key, value in values.items()
+    ) + '}'
+
+
+def render_metrics():
+    """Метрики процесса в текстовом формате Prometheus."""
+    lines = []
+    with _metrics_lock:
+        counters = sorted(_counters.items(), key=str)
+        histograms = sorted(
+            (view, list(buckets), _durations[view])
+            for view, buckets in _histograms.items()
+        )
+    seen = set()
+    for (name, view, *rest), value in counters:
+        name = f'foodgram_{name}'
+        if name not in seen:
+            seen.add(name)
+            lines.append(f'# TYPE {name} counter')
+        extra = {}
+        if rest:
+            extra = {'method': rest[0], 'status': rest[1]}
+        lines.append(f'{name}{labels(view=view, **extra)} {value:g}')
+    name = 'foodgram_request_duration_seconds'
+    if histograms:
+        lines.append(f'# TYPE {name} histogram')
+    for view, buckets, total in histograms:
+        cumulative = 0
+        for bound, amount in zip(DURATION_BUCKETS + ('+Inf',), buckets):
+            cumulative += amount
+            lines.append(
+                f'{name}_bucket{labels(view=view, le=bound)} {cumulative}'
+            )
+        lines.append(f'{name}_sum{labels(view=view)} {total:g}')
+        lines.append(f'{name}_count{labels(view=view)} {cumulative}')
+    events = connection_events()
+    name = 'foodgram_db_connections_total'
+    if events:
+        lines.append(f'# TYPE {name} counter')
+    for (event, alias), value in events:
+        lines.append(f'{name}{labels(alias=alias, event=event)} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    """Метрики процесса для Prometheus."""
+    return HttpResponse(
+        render_metrics(), content_type='text/plain; version=0.0.4'
+    )
+
+
+class PerformanceMiddleware:
+    """Замеряет запрос: представление, запросы к базе, сериализацию,
+    размер ответа и общее время.
+
+    Итоги отдаются в заголовке Server-Timing, в метриках /metrics
+    и в JSON-логе api.instrumentation в зависимости от настроек.
+    При включенном QUERY_DETECTOR запросы проверяются на N+1.
+
+    Работает и в синхронной, и в асинхронной цепочке: синхронная
+    middleware под ASGI выполняла бы все запросы воркера по очереди
+    в одном общем потоке. В асинхронном режиме запросы к базе
+    считает InstrumentedViewMixin в потоке представления.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Так Django помечает асинхронные middleware.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        stats = self.start(request)
+        with stats.capture():
+            response = self.get_response(request)
+        return self.finish(request, stats, response)
+
+    async def __acall__(self, request):
+        stats = self.start(request)
+        response = await self.get_response(request)
+        return self.finish(request, stats, response)
+
+    def start(self, request):
+        """Начинает замеры запроса."""
+        detector = None
+        if settings.QUERY_DETECTOR != 'off':
+            detector = QueryDetector()
+        stats = RequestStats(detector)
+        request.performance = stats
+        return stats
+
+    def finish(self, request, stats, response):
+        """Подводит итоги запроса."""
+        if stats.view is None and request.resolver_match:
+            stats.view = request.resolver_match.view_name
+        record = stats.summary(request, response)
+        if stats.detector is not None:
+            stats.detector.report(record['view'])
+        if settings.PERFORMANCE_SERVER_TIMING:
+            response['Server-Timing'] = server_timing(record)
+        if settings.PERFORMANCE_METRICS:
+            record_metrics(record)
+        if settings.PERFORMANCE_LOG:
+            logger.info(json.dumps(record, ensure_ascii=False))
+        return response
+
+
+class InstrumentedViewMixin:
+    """Дополняет замеры PerformanceMiddleware данными DRF:
+    имя представления с действием и время сериализации."""
+
+    def dispatch(self, request, *args, **kwargs):
+        """Считает запросы и в потоке пула асинхронных представлений."""
+        stats = getattr(request, 'performance', None)
+        if stats is None:
+            return super().dispatch(request, *args, **kwargs)
+        with stats.capture():
+            return super().dispatch(request, *args, **kwargs)
+
+    def initial(self, request, *args, **kwargs):
+        """Запоминает имя представления и действия."""
+        stats = getattr(request, 'performance', None)
+        if stats is not None:
+            stats.view = f'{type(self).__name__}.{self.action}'
+        super().initial(request, *args, **kwargs)
+
+    def get_serializer(self, *args, **kwargs):
+        """Сериализатор, чье преобразование в данные замеряется."""
+        serializer = super().get_serializer(*args, **kwargs)
+        stats = getattr(self.request, 'performance', None)
+        if stats is not None:
+            serializer.to_representation = stats.timed(
+                'serialize', serializer.to_representation
+            )
+        return serializer
@@ -0,0 +1,462 @@
+import csv
+import json
+import random
+import tempfile
+import time
+from importlib import import_module
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (
+    CaptureQueriesContext, override_settings,
+    setup_test_environment, teardown_test_environment
+)
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.counters import recount
+from recipes.feed import backfill
+from recipes.models import (
+    AmountIngredients, Favorite, Ingredient,
+    Recipe, ShoppingCart, Tag
+)
+from recipes.trending import refresh_trending
+from users.models import Follow, User
+
+INGREDIENTS_FILE = settings.BASE_DIR / 'recipes' / 'data' / 'ingredients.csv'
+IMAGE = (
+    'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABAgMAAABieywaAAA'
+    'ACVBMVEUAAAD///9fX1/S0ecCAAAACXBIWXMAAA7EAAAOxAGVKw4bAAAACklEQVQImWN'
+    'oAAAAggCByxOyYQAAAABJRU5ErkJggg=='
+)
+PASSWORD = 'benchmark'
+# Сколько объектов создается одним INSERT при заполнении базы.
+BATCH_SIZE = 5000
+TAGS = (
+    ('Завтрак', '#E26C2D', 'breakfast'),
+    ('Обед', '#49B64E', 'lunch'),
+    ('Ужин', '#8775D2', 'dinner'),
+)
+
+
+def bulk_create(model, objects):
+    """Сохраняет объекты пачками по BATCH_SIZE, не собирая все
+    объекты в памяти: на миллионе рецептов это десятки миллионов
+    строк."""
+    objects = iter(objects)
+    while True:
+        batch = list(islice(objects, BATCH_SIZE))
+        if not batch:
+            return
+        model.objects.bulk_create(batch)
+
+
+def drop_search_indexes():
+    """Удаляет индексы поиска из тестовой базы PostgreSQL."""
+    migration = import_module('recipes.migrations.0005_search_indexes')
+    with connection.schema_editor() as schema_editor:
+        migration.drop_search_indexes(None, schema_editor)
+
+
+class Command(BaseCommand):
+    """Нагрузочный прогон всех эндпоинтов API на синтетических данных.
+
+    Для каждого запроса фиксирует число SQL-запросов, время и размер
+    ответа. Завершается ошибкой, если число запросов к списку растет
+    вместе с размером страницы.
+    """
+    help = 'Замер числа запросов, времени и размера ответов API'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=40)
+        parser.add_argument('--recipes', type=int, default=300)
+        parser.add_argument('--ingredients-per-recipe', type=int,
+                            default=10)
+        parser.add_argument('--follows', type=int, default=10,
+                            help='Подписок у каждого пользователя.')
+        parser.add_argument('--favorites', type=int, default=30,
+                            help='Избранных рецептов у пользователя.')
+        parser.add_argument('--cart', type=int, default=20,
+                            help='Рецептов в списке покупок.')
+        parser.add_argument('--page-sizes', default='6,30',
+                            help='Размеры страниц через запятую.')
+        parser.add_argument('--repeat', type=int, default=3,
+                            help='Повторов каждого запроса.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--keepdb', action='store_true',
+                            help='Не удалять тестовую базу.')
+        parser.add_argument('--output', help='Сохранить результаты в JSON.')
+        parser.add_argument('--token-cache-timeout', type=int,
+                            default=settings.TOKEN_CACHE_TIMEOUT,
+                            help='TOKEN_CACHE_TIMEOUT на время прогона; '
+                                 '0 - проверять токен запросом к базе.')
+        parser.add_argument('--only',
+                            help='Замерять только запросы, в имени '
+                                 'которых есть эта строка.')
+        parser.add_argument('--search-engine',
+                            choices=('auto', 'postgres', 'like'),
+                            default=settings.RECIPE_SEARCH_ENGINE,
+                            help='RECIPE_SEARCH_ENGINE на время прогона.')
+        parser.add_argument('--drop-search-indexes', action='store_true',
+                            help='Удалить индексы поиска PostgreSQL '
+                                 'перед прогоном.')
+
+    def handle(self, *args, **options):
+        page_sizes = sorted(
+            int(size) for size in options['page_sizes'].split(',')
+        )
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, keepdb=options['keepdb']
+        )
+        try:
+            if options['drop_search_indexes']:
+                drop_search_indexes()
+            with tempfile.TemporaryDirectory() as media_root:
+                with override_settings(
+                    MEDIA_ROOT=media_root, THUMBNAIL_WORKERS=0,
+                    DB_REPLICA_ALIASES=[], QUERY_DETECTOR='raise',
+                    TOKEN_CACHE_TIMEOUT=options['token_cache_timeout'],
+                    RECIPE_SEARCH_ENGINE=options['search_engine']
+                ):
+                    self.seed(options)
+                    results = self.run_scenarios(options, page_sizes)
+        finally:
+            connection.creation.destroy_test_db(
+                old_name, verbosity=0, keepdb=options['keepdb']
+            )
+            teardown_test_environment()
+        self.report(results)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(results, file, ensure_ascii=False, indent=2)
+        self.verify(results)
+
+    def seed(self, options):
+        """Заполняет тестовую базу синтетическими данными."""
+        rnd = random.Random(options['seed'])
+        password = make_password(PASSWORD)
+        bulk_create(User, (
+            User(
+                username=f'user{number}',
+                email=f'user{number}@example.com',
+                first_name='Имя',
+                last_name='Фамилия',
+                password=password,
+            )
+            for number in range(options['users'])
+        ))
+        users = list(User.objects.order_by('id'))
+        bulk_create(Token, (
+            Token(key=Token.generate_key(), user=user) for user in users
+        ))
+        bulk_create(Tag, (
+            Tag(name=name, color=color, slug=slug)
+            for name, color, slug in TAGS
+        ))
+        tags = list(Tag.objects.all())
+        with open(INGREDIENTS_FILE, encoding='utf-8') as file:
+            bulk_create(Ingredient, (
+                Ingredient(name=name, measurement_unit=measurement_unit)
+                for name, measurement_unit in csv.reader(file)
+            ))
+        ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+        bulk_create(Recipe, (
+            Recipe(
+                author=users[number % len(users)],
+                name=f'Рецепт {number}',
+                image='recipes/benchmark.png',
+                text='Описание рецепта. ' * 20,
+                cooking_time=rnd.randint(1, 120),
+            )
+            for number in range(options['recipes'])
+        ))
+        recipe_ids = list(Recipe.objects.values_list('id', flat=True))
+        bulk_create(Recipe.tags.through, (
+            Recipe.tags.through(recipe_id=recipe_id, tag_id=tag.id)
+            for recipe_id in recipe_ids
+            for tag in rnd.sample(tags, rnd.randint(1, len(tags)))
+        ))
+        bulk_create(AmountIngredients, (
+            AmountIngredients(
+                recipe_id=recipe_id,
+                ingredients_id=ingredient_id,
+                amount=rnd.randint(1, 500),
+            )
+            for recipe_id in recipe_ids
+            for ingredient_id in rnd.sample(
+                ingredient_ids, options['ingredients_per_recipe']
+            )
+        ))
+        follows = []
+        favorites = []
+        carts = []
+        for user in users:
+            others = [author for author in users if author != user]
+            authors = (
+                others if user == users[0]
+                else rnd.sample(others, min(options['follows'], len(others)))
+            )
+            follows.extend(Follow(user=user, author=author)
+                           for author in authors)
+            favorites.extend(
+                Favorite(user=user, recipe_id=recipe_id)
+                for recipe_id in rnd.sample(
+                    recipe_ids, min(options['favorites'], len(recipe_ids))
+                )
+            )
+            carts.extend(
+                ShoppingCart(user=user, recipe_id=recipe_id)
+                for recipe_id in rnd.sample(
+                    recipe_ids, min(options['cart'], len(recipe_ids))
+                )
+            )
+        bulk_create(Follow, follows)
+        bulk_create(Favorite, favorites)
+        bulk_create(ShoppingCart, carts)
+        # Новый пользователь без подписок, избранного и покупок:
+        # пустые списки ломаются чаще заполненных.
+        newcomer = User.objects.create(
+            username='newcomer',
+            email='newcomer@example.com',
+            first_name='Имя',
+            last_name='Фамилия',
+            password=password,
+        )
+        Token.objects.create(user=newcomer)
+        recount()
+        refresh_trending(full=True)
+        backfill()
+        self.stdout.write(
+            f'Данные: {len(users)} пользователей, {len(recipe_ids)} '
+            f'рецептов, {len(ingredient_ids)} ингредиентов, '
+            f'{len(follows)} подписок, {len(favorites)} избранных, '
+            f'{len(carts)} в списках покупок.'
+        )
+
+    def get_scenarios(self, page_sizes):
+        """Возвращает список запросов для замера.
+
+        Элемент списка: (имя, метод, адрес, тело, зависит ли
+        ответ от размера страницы[, от чьего имени: None - аноним]).
+        По умолчанию запрос выполняется от имени первого пользователя.
+        """
+        user, author = User.objects.order_by('id')[:2]
+        newcomer = User.objects.get(username='newcomer')
+        tag = Tag.objects.first()
+        recipe = Recipe.objects.exclude(author=user).first()
+        own_recipe, deleted_recipe = Recipe.objects.filter(author=user)[:2]
+        free_recipes = Recipe.objects.exclude(
+            favorite__user=user).exclude(shopping_cart__user=user)
+        free_recipe = free_recipes.first()
+        plan = {'recipes': list(
+            free_recipes.values_list('id', flat=True)[1:31]
+        )}
+        ingredient_ids = list(
+            Ingredient.objects.values_list('id', flat=True)[:10]
+        )
+        recipe_data = {
+            'ingredients': [
+                {'id': ingredient_id, 'amount': 10}
+                for ingredient_id in ingredient_ids
+            ],
+            'tags': [tag.id],
+            'image': IMAGE,
+            'name': 'Новый рецепт',
+            'text': 'Описание',
+            'cooking_time': 15,
+        }
+        scenarios = []
+        for size in page_sizes:
+            scenarios.extend((
+                (f'recipes list limit={size}', 'get',
+                 f'/api/recipes/?limit={size}', None, True),
+                (f'recipes cursor limit={size}', 'get',
+                 f'/api/recipes/?cursor=&limit={size}', None, True),
+                (f'recipes favorited limit={size}', 'get',
+                 f'/api/recipes/?is_favorited=1&limit={size}', None, True),
+                (f'recipes in cart limit={size}', 'get',
+                 f'/api/recipes/?is_in_shopping_cart=1&limit={size}',
+                 None, True),
+                (f'recipes popular limit={size}', 'get',
+                 f'/api/recipes/?ordering=popular&limit={size}', None, True),
+                (f'recipes trending limit={size}', 'get',
+                 f'/api/recipes/?ordering=trending&limit={size}', None, True),
+                (f'recipes feed limit={size}', 'get',
+                 f'/api/recipes/feed/?limit={size}', None, True),
+                (f'recipes by tag limit={size}', 'get',
+                 f'/api/recipes/?tags={tag.slug}&limit={size}', None, True),
+                (f'recipes search limit={size}', 'get',
+                 f'/api/recipes/?search=рецепт&limit={size}', None, True),
+                (f'recipes search ingredient limit={size}', 'get',
+                 f'/api/recipes/?search=молоко&limit={size}', None, True),
+                (f'users list limit={size}', 'get',
+                 f'/api/users/?limit={size}', None, True),
+                (f'subscriptions limit={size}', 'get',
+                 f'/api/users/subscriptions/?limit={size}', None, True),
+                (f'subscriptions cursor limit={size}', 'get',
+                 f'/api/users/subscriptions/?cursor=&limit={size}',
+                 None, True),
+                (f'no subscriptions limit={size}', 'get',
+                 f'/api/users/subscriptions/?limit={size}',
+                 None, True, newcomer),
+                (f'no subscriptions cursor limit={size}', 'get',
+                 f'/api/users/subscriptions/?cursor=&limit={size}',
+                 None, True, newcomer),
+                (f'no feed limit={size}', 'get',
+                 f'/api/recipes/feed/?limit={size}', None, True, newcomer),
+                (f'no favorites limit={size}', 'get',
+                 f'/api/recipes/?is_favorited=1&limit={size}',
+                 None, True, newcomer),
+                (f'anonymous recipes list limit={size}', 'get',
+                 f'/api/recipes/?limit={size}', None, True, None),
+            ))
+        scenarios.extend((
+            ('recipe detail', 'get', f'/api/recipes/{recipe.id}/',
+             None, False),
+            ('recipe create', 'post', '/api/recipes/', recipe_data, False),
+            ('recipe update', 'patch', f'/api/recipes/{own_recipe.id}/',
+             recipe_data, False),
+            ('recipe delete', 'delete', f'/api/recipes/{deleted_recipe.id}/',
+             None, False),
+            ('favorite add', 'post',
+             f'/api/recipes/{free_recipe.id}/favorite/', None, False),
+            ('favorite delete', 'delete',
+             f'/api/recipes/{free_recipe.id}/favorite/', None, False),
+            ('cart add', 'post',
+             f'/api/recipes/{free_recipe.id}/shopping_cart/', None, False),
+            ('cart delete', 'delete',
+             f'/api/recipes/{free_recipe.id}/shopping_cart/', None, False),
+            ('favorite bulk add', 'post', '/api/recipes/favorite/',
+             plan, False),
+            ('favorite bulk delete', 'delete', '/api/recipes/favorite/',
+             plan, False),
+            ('cart bulk add', 'post', '/api/recipes/shopping_cart/',
+             plan, False),
+            ('cart bulk delete', 'delete', '/api/recipes/shopping_cart/',
+             plan, False),
+            ('download shopping cart', 'get',
+             '/api/recipes/download_shopping_cart/', None, False),
+            ('download shopping cart pdf', 'get',
+             '/api/recipes/download_shopping_cart/?format=pdf', None, False),
+            ('download empty shopping cart', 'get',
+             '/api/recipes/download_shopping_cart/', None, False, newcomer),
+            ('cart clear', 'delete', '/api/recipes/shopping_cart/clear/',
+             None, False),
+            ('unsubscribe', 'delete', f'/api/users/{author.id}/subscribe/',
+             None, False),
+            ('subscribe', 'post', f'/api/users/{author.id}/subscribe/',
+             None, False),
+            ('user detail', 'get', f'/api/users/{author.id}/', None, False),
+            ('user me', 'get', '/api/users/me/', None, False),
+            ('tags list', 'get', '/api/tags/', None, False),
+            ('tag detail', 'get', f'/api/tags/{tag.id}/', None, False),
+            ('ingredients all', 'get', '/api/ingredients/', None, False),
+            ('ingredients search', 'get', '/api/ingredients/?name=мол',
+             None, False),
+            ('ingredient detail', 'get',
+             f'/api/ingredients/{ingredient_ids[0]}/', None, False),
+            ('user register', 'post', '/api/users/', {
+                'email': 'registered@example.com',
+                'username': 'registered',
+                'first_name': 'Имя',
+                'last_name': 'Фамилия',
+                'password': 'Benchmark-Password-1',
+            }, False, None),
+            ('token login', 'post', '/api/auth/token/login/', {
+                'email': newcomer.email, 'password': PASSWORD,
+            }, False, None),
+            ('set password', 'post', '/api/users/set_password/', {
+                'current_password': PASSWORD,
+                'new_password': 'Benchmark-Password-2',
+            }, False, newcomer),
+            ('token logout', 'post', '/api/auth/token/logout/',
+             None, False, newcomer),
+        ))
+        return user, scenarios
+
+    def run_scenarios(self, options, page_sizes):
+        """Выполняет запросы и собирает метрики."""
+        user, scenarios = self.get_scenarios(page_sizes)
+        if options['only']:
+            scenarios = [scenario for scenario in scenarios
+                         if options['only'] in scenario[0]]
+        clients = {}
+        results = []
+        for name, method, url, data, paginated, *as_user in scenarios:
+            as_user = as_user[0] if as_user else user
+            client = clients.get(as_user)
+            if client is None:
+                client = clients[as_user] = APIClient()
+                if as_user is not None:
+                    client.credentials(
+                        HTTP_AUTHORIZATION=f'Token {as_user.auth_token.key}'
+                    )
+                    # Первый запрос кладет пользователя токена в кэш,
+                    # и при --repeat 1 этот запрос не попадает в замер.
+                    client.get('/api/users/me/')
+            # Изменяющие запросы выполняются один раз, иначе повтор
+            # вернет другой ответ.
+            repeat = options['repeat'] if method == 'get' else 1
+            timings = []
+            for _ in range(repeat):
+                with CaptureQueriesContext(connection) as queries:
+                    start = time.perf_counter()
+                    response = getattr(client, method)(
+                        url, data, format='json'
+                    )
+                    if response.streaming:
+                        content = b''.join(response.streaming_content)
+                    else:
+                        content = response.content
+                    timings.append(time.perf_counter() - start)
+            results.append({
+                'name': name,
+                'url': url,
+                'method': method.upper(),
+                'status': response.status_code,
+                'queries': len(queries),
+                'time_ms': round(min(timings) * 1000, 2),
+                'bytes': len(content),
+                'paginated': paginated,
+            })
+        return results
+
+    def report(self, results):
+        """Печатает таблицу результатов."""
+        self.stdout.write(
+            f'{"endpoint":<36}{"status":>7}{"queries":>9}'
+            f'{"ms":>10}{"bytes":>10}'
+        )
+        for result in results:
+            self.stdout.write(
+                f'{result["name"]:<36}{result["status"]:>7}'
+                f'{result["queries"]:>9}{result["time_ms"]:>10}'
+                f'{result["bytes"]:>10}'
+            )
+
+    def verify(self, results):
+        """Проверяет ошибки и рост числа запросов."""
+        errors = [
+            f'{result["name"]}: статус {result["status"]}'
+            for result in results if result['status'] >= 400
+        ]
+        queries = {}
+        for result in results:
+            if result['paginated']:
+                endpoint = result['name'].rsplit(' limit=', 1)[0]
+                queries.setdefault(endpoint, []).append(result['queries'])
+        for endpoint, counts in queries.items():
+            if len(set(counts)) > 1:
+                errors.append(
+                    f'{endpoint}: число запросов зависит от размера '
+                    f'страницы {counts}'
+                )
+        if errors:
+            raise CommandError('\n'.join(errors))
+        self.stdout.write(self.style.SUCCESS(
+            'Число запросов не зависит от размера страницы.'
+        ))
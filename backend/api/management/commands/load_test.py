@@ -0,0 +1,156 @@
+import asyncio
+import json
+import statistics
+import time
+from urllib.parse import quote, urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+DEFAULT_PATHS = (
+    '/api/recipes/,/api/recipes/?limit=30,/api/tags/,'
+    '/api/ingredients/?name=мол'
+)
+# Адреса, которые добавляются к --paths при указанном --token.
+TOKEN_PATHS = '/api/recipes/download_shopping_cart/'
+
+
+def build_request(host, path, token=None, extra_headers=()):
+    """Собирает HTTP/1.1 GET запрос в байтах."""
+    lines = [
+        f'GET {quote(path, safe="/?=&,")} HTTP/1.1',
+        f'Host: {host}',
+        'Accept: application/json',
+        'Connection: close',
+        *extra_headers,
+    ]
+    if token:
+        lines.append(f'Authorization: Token {token}')
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode()
+
+
+async def fetch(host, port, payload, drip=None):
+    """Отправляет запрос и читает ответ до закрытия соединения.
+
+    drip: (число кусков, пауза) - заголовки отправляются по частям,
+    как у медленного клиента.
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        if drip:
+            parts, pause = drip
+            head, tail = payload[:-2], payload[-2:]
+            step = max(len(head) // parts, 1)
+            for start in range(0, len(head), step):
+                writer.write(head[start:start + step])
+                await writer.drain()
+                await asyncio.sleep(pause)
+            writer.write(tail)
+        else:
+            writer.write(payload)
+        await writer.drain()
+        response = await reader.read()
+    finally:
+        writer.close()
+    status_line = response.split(b'\r\n', 1)[0].split()
+    return int(status_line[1]) if len(status_line) > 1 else 0
+
+
+class Command(BaseCommand):
+    """Нагрузочный тест запущенного сервера.
+
+    Запускает медленных клиентов, которые долго передают заголовки,
+    и параллельно замеряет задержку обычных запросов. Для сравнения
+    режимов команду запускают против сервера с SERVER_MODE=wsgi
+    и SERVER_MODE=asgi.
+    """
+    help = 'Нагрузочный тест запущенного сервера'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000',
+                            help='Адрес сервера.')
+        parser.add_argument('--paths', default=DEFAULT_PATHS,
+                            help='Адреса запросов через запятую.')
+        parser.add_argument('--requests', type=int, default=500,
+                            help='Число обычных запросов.')
+        parser.add_argument('--concurrency', type=int, default=20,
+                            help='Число одновременных обычных запросов.')
+        parser.add_argument('--slow-clients', type=int, default=0,
+                            help='Число медленных клиентов.')
+        parser.add_argument('--slow-seconds', type=float, default=10,
+                            help='Сколько секунд медленный клиент '
+                                 'передает запрос.')
+        parser.add_argument('--token',
+                            help='Токен пользователя; с ним в тест '
+                                 'попадает и выгрузка списка покупок.')
+        parser.add_argument('--output', help='Файл для результатов в JSON.')
+
+    def handle(self, *args, **options):
+        url = urlsplit(options['url'])
+        if url.scheme != 'http' or not url.hostname:
+            raise CommandError('Поддерживается только http://хост:порт.')
+        result = asyncio.run(self.run(url, options))
+        self.report(result)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(result, file, ensure_ascii=False, indent=2)
+
+    async def run(self, url, options):
+        """Запускает медленных и обычных клиентов."""
+        host, port = url.hostname, url.port or 80
+        paths = options['paths']
+        if options['token']:
+            paths += ',' + TOKEN_PATHS
+        paths = [path for path in paths.split(',') if path]
+        slow = [
+            asyncio.create_task(fetch(
+                host, port,
+                build_request(url.netloc, paths[0], options['token'],
+                              ('X-Load-Test: slow',)),
+                drip=(10, options['slow_seconds'] / 10)
+            ))
+            for _ in range(options['slow_clients'])
+        ]
+        await asyncio.sleep(0.5 if slow else 0)
+        queue = asyncio.Queue()
+        for number in range(options['requests']):
+            queue.put_nowait(paths[number % len(paths)])
+        timings = []
+        statuses = {}
+
+        async def worker():
+            while not queue.empty():
+                path = queue.get_nowait()
+                started = time.perf_counter()
+                try:
+                    status = await fetch(
+                        host, port,
+                        build_request(url.netloc, path, options['token'])
+                    )
+                except OSError:
+                    status = 0
+                timings.append((time.perf_counter() - started) * 1000)
+                statuses[status] = statuses.get(status, 0) + 1
+
+        started = time.perf_counter()
+        await asyncio.gather(
+            *(worker() for _ in range(options['concurrency']))
+        )
+        elapsed = time.perf_counter() - started
+        slow_statuses = await asyncio.gather(*slow, return_exceptions=True)
+        timings.sort()
+        return {
+            'requests': len(timings),
+            'seconds': round(elapsed, 2),
+            'rps': round(len(timings) / elapsed, 1),
+            'p50_ms': round(statistics.median(timings), 1),
+            'p95_ms': round(timings[int(len(timings) * 0.95) - 1], 1),
+            'max_ms': round(timings[-1], 1),
+            'statuses': {str(key): value for key, value in statuses.items()},
+            'slow_clients': len(slow),
+            'slow_ok': sum(status == 200 for status in slow_statuses),
+        }
+
+    def report(self, result):
+        """Выводит результаты."""
+        for key, value in result.items():
+            self.stdout.write(f'{key:<14}{value}')
@@ -0,0 +1,71 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.renderers import JSONRenderer
+
+from recipes.cache import get_version
+
+from .db import can_read_replica, mark_write, primary_reads, read_from_replica
+
+
+class ReplicaReadMixin:
+    """Чтение безопасных запросов с реплик.
+
+    После успешной записи пользователь какое-то время читает
+    из основной базы и видит свои изменения.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        """После аутентификации выбирает базу для чтения."""
+        super().initial(request, *args, **kwargs)
+        if (
+            request.method in SAFE_METHODS
+            and can_read_replica(request.user)
+        ):
+            self.replica_token = read_from_replica.set(True)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        """Возвращает чтение в основную базу и отмечает запись."""
+        token = getattr(self, 'replica_token', None)
+        if token is not None:
+            read_from_replica.reset(token)
+            self.replica_token = None
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            mark_write(request.user)
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class CachedListMixin:
+    """Кэширует готовый JSON списка справочника.
+
+    Ключ кэша содержит версию набора данных, которую повышают сигналы
+    моделей, поэтому процессы с общим кэшем одинаково видят свежесть
+    данных. Ответ несет сильный ETag и 304 на совпадающий If-None-Match.
+    """
+    cache_version_name = None
+
+    def list(self, request, *args, **kwargs):
+        """Отдает список из кэша; запросы с параметрами не кэшируются."""
+        if request.query_params:
+            return super().list(request, *args, **kwargs)
+        version = get_version(self.cache_version_name)
+        key = f'list:{self.cache_version_name}:{version}'
+        cached = cache.get(key)
+        if cached is None:
+            # Реплика может отставать, а кэш живет до следующей версии.
+            with primary_reads():
+                data = super().list(request, *args, **kwargs).data
+            content = JSONRenderer().render(data)
+            cached = (quote_etag(hashlib.sha1(content).hexdigest()), content)
+            cache.set(key, cached, timeout=settings.REFERENCE_CACHE_TIMEOUT)
+        etag, content = cached
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = HttpResponse(content, content_type='application/json')
+        response['ETag'] = etag
+        return response
@@ -1,7 +1,36 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 
 
 class LimitPagePagination(PageNumberPagination):
     """Пагинатор"""
     page_size = 6
     page_size_query_param = 'limit'
+
+
+class LimitCursorPagination(CursorPagination):
+    """Курсорный пагинатор по убыванию id.
+
+    Не считает общее число записей и не использует OFFSET,
+    поэтому страница на любой глубине стоит одинаково.
+    """
+    page_size = 6
+    page_size_query_param = 'limit'
+    ordering = '-id'
+
+
+class CursorPaginationMixin:
+    """Переключает вьюсет на курсорную пагинацию при наличии ?cursor=.
+
+    Первая страница запрашивается с пустым курсором: ?cursor=
+    """
+    cursor_pagination_class = LimitCursorPagination
+
+    @property
+    def paginator(self):
+        """Возвращает пагинатор для текущего запроса."""
+        if not hasattr(self, '_paginator'):
+            query_param = self.cursor_pagination_class.cursor_query_param
+            if query_param in self.request.query_params:
+                self._paginator = self.cursor_pagination_class()
+                return self._paginator
+        return super().paginator
@@ -0,0 +1,54 @@
+from functools import lru_cache
+from io import BytesIO
+from pathlib import Path
+
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.utils import simpleSplit
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen.canvas import Canvas
+
+FONT_FILE = (
+    Path(__file__).resolve().parent / 'fonts' / 'SourceCodePro-Regular.ttf'
+)
+FONT_NAME = 'SourceCodePro'
+PAGE_WIDTH, PAGE_HEIGHT = A4
+MARGIN = 50
+FONT_SIZE = 11
+TITLE_SIZE = 14
+LEADING = 1.4
+
+
+@lru_cache(maxsize=None)
+def get_font():
+    """Шрифт регистрируется в reportlab один раз на процесс."""
+    pdfmetrics.registerFont(TTFont(FONT_NAME, str(FONT_FILE)))
+    return FONT_NAME
+
+
+def render_pdf(title, lines):
+    """Документ PDF со строками текста.
+
+    reportlab встраивает только использованные глифы шрифта, поэтому
+    кириллица отображается без шрифтов на стороне читателя, а документ
+    не тащит файл шрифта целиком. Документ собирается в памяти:
+    строк в списке покупок не больше, чем ингредиентов в справочнике.
+    """
+    font = get_font()
+    buffer = BytesIO()
+    canvas = Canvas(buffer, pagesize=A4, pageCompression=1)
+    canvas.setTitle(title)
+    width = PAGE_WIDTH - 2 * MARGIN
+    y = PAGE_HEIGHT - MARGIN
+    for size, text in [(TITLE_SIZE, title)] + [
+        (FONT_SIZE, line) for line in lines
+    ]:
+        for part in simpleSplit(text, font, size, width) or ['']:
+            y -= size * LEADING
+            if y < MARGIN:
+                canvas.showPage()
+                y = PAGE_HEIGHT - MARGIN - size * LEADING
+            canvas.setFont(font, size)
+            canvas.drawString(MARGIN, y, part)
+    canvas.save()
+    return buffer.getvalue()
@@ -17,6 +17,6 @@ class IsAuthorOrReadOnly(permissions.BasePermission):
         if request.method == 'POST':
             return True
         if (request.method in ['DELETE', 'PATCH']
-           and request.user == obj.author):
+           and request.user.id == obj.author_id):
             return True
         return False
@@ -0,0 +1,156 @@
+import logging
+import re
+import sys
+import time
+import warnings
+from collections import defaultdict
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.fields import Field
+
+logger = logging.getLogger(__name__)
+
+MODES = ('off', 'log', 'warn', 'raise')
+IGNORED_PREFIXES = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')
+PROJECT_DIR = str(settings.BASE_DIR)
+
+FINGERPRINT_RULES = (
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'(?<![\w"])-?\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'%s'), '?'),
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)'), '(...)'),
+    (re.compile(r'\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+'), '(...)'),
+    (re.compile(r'\s+'), ' '),
+)
+
+
+class RepeatedQueryWarning(UserWarning):
+    """Один и тот же запрос выполняется много раз за запрос к API."""
+
+
+class RepeatedQueryError(Exception):
+    """Повторяющиеся запросы в режиме QUERY_DETECTOR=raise."""
+
+
+def fingerprint(sql):
+    """SQL без значений: запросы, отличающиеся только параметрами
+    и длиной списков IN (...), получают одинаковый отпечаток."""
+    for pattern, replacement in FINGERPRINT_RULES:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
+
+def origin(frame):
+    """Откуда выполнен запрос: цепочка полей и методов сериализаторов
+    и строки кода проекта, от внешних вызовов к внутренним."""
+    serializers = []
+    lines = []
+    while frame is not None:
+        code = frame.f_code
+        owner = frame.f_locals.get('self')
+        if isinstance(owner, Field) and not code.co_name.startswith('<'):
+            name = f'{type(owner).__name__}.{code.co_name}'
+            if owner.field_name:
+                name += f'[{owner.field_name}]'
+            if not serializers or serializers[-1] != name:
+                serializers.append(name)
+        filename = code.co_filename
+        if (
+            filename.startswith(PROJECT_DIR)
+            and 'site-packages' not in filename
+            and not filename.endswith(('query_detector.py',
+                                       'instrumentation.py'))
+        ):
+            lines.append(
+                f'{Path(filename).relative_to(PROJECT_DIR)}:'
+                f'{frame.f_lineno} in {code.co_name}'
+            )
+        frame = frame.f_back
+    return serializers[::-1], lines[::-1]
+
+
+class QueryDetector:
+    """Ищет повторяющиеся и медленные запросы за один запрос к API.
+
+    Запросы группируются по отпечатку; группа из QUERY_DETECTOR_REPEATS
+    и больше запросов почти всегда означает запрос на каждую строку
+    списка (N+1). Для каждой группы запоминается место первого вызова.
+    """
+
+    def __init__(self, mode=None):
+        self.mode = mode or settings.QUERY_DETECTOR
+        if self.mode not in MODES:
+            raise ImproperlyConfigured(
+                f'QUERY_DETECTOR должен быть одним из: {", ".join(MODES)}.'
+            )
+        self.counts = defaultdict(int)
+        self.durations = defaultdict(float)
+        self.origins = {}
+        self.slow = []
+
+    def __call__(self, execute, sql, params, many, context):
+        """Обертка выполнения SQL для connection.execute_wrapper."""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            if not sql.lstrip().upper().startswith(IGNORED_PREFIXES):
+                self.record(sql, duration)
+
+    def record(self, sql, duration):
+        key = fingerprint(sql)
+        self.counts[key] += 1
+        self.durations[key] += duration
+        if key not in self.origins:
+            self.origins[key] = origin(sys._getframe(2))
+        if duration * 1000 >= settings.QUERY_DETECTOR_SLOW_MS:
+            self.slow.append((key, duration))
+
+    def repeated(self):
+        """Группы повторяющихся запросов, самые частые первыми."""
+        return sorted(
+            (
+                (count, key) for key, count in self.counts.items()
+                if count >= settings.QUERY_DETECTOR_REPEATS
+            ),
+            reverse=True
+        )
+
+    def describe(self, view, count, key):
+        serializers, lines = self.origins[key]
+        parts = [
+            f'{view}: {count} одинаковых запросов '
+            f'({self.durations[key] * 1000:.1f} мс): {key}'
+        ]
+        if serializers:
+            parts.append('  сериализатор: ' + ' > '.join(serializers))
+        parts.extend(f'  {line}' for line in lines)
+        return '\n'.join(parts)
+
+    def report(self, view):
+        """Сообщает о находках в соответствии с QUERY_DETECTOR.
+
+        Медленные запросы только пишутся в лог: их длительность
+        зависит от машины, и падать на них в тестах нельзя.
+        """
+        for key, duration in self.slow:
+            logger.warning(
+                '%s: медленный запрос (%.1f мс): %s',
+                view, duration * 1000, key
+            )
+        messages = [
+            self.describe(view, count, key)
+            for count, key in self.repeated()
+        ]
+        if not messages:
+            return
+        if self.mode == 'raise':
+            raise RepeatedQueryError('\n'.join(messages))
+        for message in messages:
+            if self.mode == 'warn':
+                warnings.warn(message, RepeatedQueryWarning, stacklevel=2)
+            else:
+                logger.warning(message)
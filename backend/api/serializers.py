@@ -1,15 +1,20 @@
-from django.db.models import F
-from django.shortcuts import get_object_or_404
+import io
+
 from djoser.serializers import UserCreateSerializer, UserSerializer
-from drf_extra_fields.fields import Base64ImageField
+from drf_extra_fields.fields import Base64FieldMixin, Base64ImageField
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import UploadedFile
 from django.db.transaction import atomic
+from django.conf import settings
 from rest_framework.serializers import (
     CharField, EmailField, Field,
-    IntegerField, ModelSerializer,
+    IntegerField, ListField, ModelSerializer,
     PrimaryKeyRelatedField, ReadOnlyField,
-    SerializerMethodField
+    Serializer, SerializerMethodField, ValidationError
 )
 from rest_framework.validators import UniqueValidator
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.tokens import RefreshToken
 
 from users.models import Follow, User
 from recipes.models import (
@@ -17,7 +22,83 @@ from recipes.models import (
     Ingredient, Recipe,
     ShoppingCart, Tag
 )
-from recipes.validators import validate_time, validate_ingredients
+from recipes.thumbnails import schedule_thumbnails, srcset, thumbnail_urls
+from recipes.validators import (
+    validate_image_dimensions, validate_image_size,
+    validate_ingredients, validate_time
+)
+
+from .authentication import is_revoked
+
+RECIPES_LIMIT = 3
+
+
+def get_recipes_limit(request):
+    """Число рецептов автора в подписках из параметра recipes_limit."""
+    if request is None:
+        return RECIPES_LIMIT
+    try:
+        limit = int(request.query_params.get('recipes_limit', RECIPES_LIMIT))
+    except ValueError:
+        return RECIPES_LIMIT
+    return min(max(limit, 0), settings.RECIPES_LIMIT_MAX)
+
+
+class RecipeImageField(Base64ImageField):
+    """Картинка рецепта файлом из multipart/form-data или строкой base64.
+
+    Размер и стороны картинки проверяются до ее декодирования.
+    """
+
+    def to_internal_value(self, data):
+        """Принимает загруженный файл или строку base64."""
+        if isinstance(data, UploadedFile):
+            validate_image_size(data.size)
+            extension = validate_image_dimensions(data)
+            extension = 'jpg' if extension == 'jpeg' else extension
+            if extension not in self.ALLOWED_TYPES:
+                raise ValidationError(self.INVALID_TYPE_MESSAGE)
+            data.name = f'{self.get_file_name(data)}.{extension}'
+            return super(Base64FieldMixin, self).to_internal_value(data)
+        if isinstance(data, str):
+            validate_image_size(len(data) * 3 // 4)
+        return super().to_internal_value(data)
+
+    def get_file_extension(self, filename, decoded_file):
+        """Проверяет стороны картинки сразу после base64."""
+        validate_image_dimensions(io.BytesIO(decoded_file))
+        return super().get_file_extension(filename, decoded_file)
+
+
+class ThumbnailsField(Field):
+    """Ссылки на уменьшенные копии картинки рецепта по размерам."""
+    links = staticmethod(thumbnail_urls)
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def bind(self, field_name, parent):
+        """Читает поле thumbnails рецепта под любым именем."""
+        if self.source is None and field_name != 'thumbnails':
+            self.source = 'thumbnails'
+        super().bind(field_name, parent)
+
+    def to_representation(self, thumbnails):
+        """Строит абсолютные ссылки, если доступен запрос."""
+        request = self.context.get('request')
+        build_url = None
+        if request is not None:
+            def build_url(name):
+                return request.build_absolute_uri(
+                    default_storage.url(name)
+                )
+        return self.links(thumbnails, build_url)
+
+
+class SrcsetField(ThumbnailsField):
+    """Значения атрибута srcset картинки рецепта по форматам."""
+    links = staticmethod(srcset)
 
 
 class CreateUserSerializer(UserCreateSerializer):
@@ -58,8 +139,10 @@ class UsersSerializer(UserSerializer):
 
     def get_is_subscribed(self, obj):
         """Проверка подписки пользователей."""
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         request = self.context.get('request')
-        if request is None and request.user.is_anonymous:
+        if request is None or request.user.is_anonymous:
             return False
         return Follow.objects.filter(
             user=request.user.id,
@@ -117,6 +200,8 @@ class RecipeSerializer(ModelSerializer):
     is_in_shopping_cart = SerializerMethodField(read_only=True)
     is_favorited = SerializerMethodField(read_only=True)
     image = Base64ImageField(read_only=True)
+    thumbnails = ThumbnailsField()
+    srcset = SrcsetField()
 
     class Meta:
         model = Recipe
@@ -129,12 +214,22 @@ class RecipeSerializer(ModelSerializer):
             'is_in_shopping_cart',
             'name',
             'image',
+            'thumbnails',
+            'srcset',
             'text',
             'cooking_time',
         )
 
+    def to_representation(self, obj):
+        """Передает аннотацию подписки во вложенный сериализатор автора."""
+        if hasattr(obj, 'author_is_subscribed'):
+            obj.author.is_subscribed = obj.author_is_subscribed
+        return super().to_representation(obj)
+
     def get_is_in_shopping_cart(self, obj):
         """Проверка - находится ли рецепт в списке  покупок."""
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         request = self.context.get('request')
         if request is None or request.user.is_anonymous:
             return False
@@ -145,6 +240,8 @@ class RecipeSerializer(ModelSerializer):
 
     def get_is_favorited(self, obj):
         """Проверка - находится ли рецепт в избранном"""
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         request = self.context.get('request')
         if request is None or request.user.is_anonymous:
             return False
@@ -156,7 +253,7 @@ class RecipeSerializer(ModelSerializer):
     @staticmethod
     def get_ingredients(obj):
         """Получает список ингридиентов для рецепта."""
-        ingredients = AmountIngredients.objects.filter(recipe=obj)
+        ingredients = obj.amount_ingredient.all()
         return ReadIngredientsInRecipeSerializer(ingredients, many=True).data
 
 
@@ -167,7 +264,7 @@ class RecipeCreateSerializer(ModelSerializer):
         queryset=Tag.objects.all(),
         many=True
     )
-    image = Base64ImageField()
+    image = RecipeImageField()
     name = CharField(max_length=200)
     cooking_time = IntegerField()
     author = UserSerializer(read_only=True)
@@ -187,19 +284,48 @@ class RecipeCreateSerializer(ModelSerializer):
 
     @staticmethod
     def create_ingredients(ingredients, recipe):
-        """Получение списка ингридиентов."""
-        for ingredient in ingredients:
-            amount = ingredient['amount']
-            if AmountIngredients.objects.filter(
-                    recipe=recipe,
-                    ingredients=get_object_or_404(
-                        Ingredient, id=ingredient['id'])).exists():
-                amount += F('amount')
-            AmountIngredients.objects.update_or_create(
+        """Добавляет ингредиенты рецепта одним запросом."""
+        AmountIngredients.objects.bulk_create(
+            AmountIngredients(
                 recipe=recipe,
-                ingredients=get_object_or_404(
-                    Ingredient, id=ingredient['id']),
-                defaults={'amount': amount})
+                ingredients_id=ingredient['id'],
+                amount=ingredient['amount']
+            )
+            for ingredient in ingredients
+        )
+
+    @staticmethod
+    def sync_ingredients(ingredients, recipe):
+        """Обновляет ингредиенты рецепта, изменяя только отличающиеся."""
+        current = {
+            item.ingredients_id: item
+            for item in AmountIngredients.objects.filter(recipe=recipe)
+        }
+        amounts = {
+            ingredient['id']: ingredient['amount']
+            for ingredient in ingredients
+        }
+        stale = [
+            item.id for ingredient_id, item in current.items()
+            if ingredient_id not in amounts
+        ]
+        if stale:
+            AmountIngredients.objects.filter(id__in=stale).delete()
+        changed = []
+        for ingredient_id, item in current.items():
+            amount = amounts.get(ingredient_id)
+            if amount is not None and item.amount != amount:
+                item.amount = amount
+                changed.append(item)
+        if changed:
+            AmountIngredients.objects.bulk_update(changed, ['amount'])
+        added = [
+            {'id': ingredient_id, 'amount': amount}
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in current
+        ]
+        if added:
+            RecipeCreateSerializer.create_ingredients(added, recipe)
 
     @atomic
     def create(self, validated_data):
@@ -213,6 +339,7 @@ class RecipeCreateSerializer(ModelSerializer):
         )
         self.create_ingredients(ingredients_data, recipe)
         recipe.tags.set(tags_data)
+        schedule_thumbnails(recipe)
         return recipe
 
     @atomic
@@ -220,22 +347,29 @@ class RecipeCreateSerializer(ModelSerializer):
         """Обновление рецепта"""
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
-        AmountIngredients.objects.filter(recipe=recipe).delete()
-        self.create_ingredients(
+        self.sync_ingredients(
             ingredients,
             recipe
         )
         recipe.tags.set(tags)
-        return super().update(
+        recipe = super().update(
             recipe,
             validated_data
         )
+        if 'image' in validated_data:
+            schedule_thumbnails(recipe)
+        return recipe
 
     def to_representation(self, recipe):
         """Переопределение рецепта"""
+        request = self.context.get('request')
+        if request is not None:
+            recipe = Recipe.objects.with_related().with_user_flags(
+                request.user
+            ).get(pk=recipe.pk)
         data = RecipeSerializer(
             recipe,
-            context={'request': self.context.get('request')}).data
+            context={'request': request}).data
         return data
 
     def validate_cooking_time(self, cooking_time):
@@ -246,7 +380,19 @@ class RecipeCreateSerializer(ModelSerializer):
     def validate(self, data):
         """Проверяем ингредиенты в рецепте."""
         ingredients = self.initial_data.get('ingredients')
-        valid_ingredients = validate_ingredients(ingredients)
+        valid_ingredients = [
+            {'id': int(ingredient['id']), 'amount': int(ingredient['amount'])}
+            for ingredient in validate_ingredients(ingredients)
+        ]
+        ids = [ingredient['id'] for ingredient in valid_ingredients]
+        found = Ingredient.objects.in_bulk(ids)
+        missing = [str(id) for id in ids if id not in found]
+        if missing:
+            raise ValidationError(
+                {'ingredients': [
+                    f'Ингредиенты не найдены: {", ".join(missing)}.'
+                ]}
+            )
         data['ingredients'] = valid_ingredients
         return data
 
@@ -254,6 +400,8 @@ class RecipeCreateSerializer(ModelSerializer):
 class RecipeForFollowersSerializer(ModelSerializer):
     """Сериализатор для вывода рецептов в избранном и списке покупок."""
     image = Base64ImageField()
+    thumbnails = ThumbnailsField()
+    srcset = SrcsetField()
 
     class Meta:
         model = Recipe
@@ -261,6 +409,8 @@ class RecipeForFollowersSerializer(ModelSerializer):
             'id',
             'name',
             'image',
+            'thumbnails',
+            'srcset',
             'cooking_time'
         )
 
@@ -269,7 +419,11 @@ class RecipeFollowUserField(Field):
     """Сериализатор для вывода рецептов в подписках."""
 
     def get_attribute(self, instance):
-        return Recipe.objects.filter(author=instance.author)
+        """Берет подгруженные рецепты или ограниченную выборку."""
+        if hasattr(instance, 'recipes_preview'):
+            return instance.recipes_preview
+        limit = get_recipes_limit(self.context.get('request'))
+        return Recipe.objects.filter(author=instance.author_id)[:limit]
 
     def to_representation(self, recipes_list):
         """Переопределение списка рецептов"""
@@ -280,6 +434,8 @@ class RecipeFollowUserField(Field):
                     "id": recipes.id,
                     "name": recipes.name,
                     "image": recipes.image.url,
+                    "thumbnails": thumbnail_urls(recipes.thumbnails),
+                    "srcset": srcset(recipes.thumbnails),
                     "cooking_time": recipes.cooking_time,
                 }
             )
@@ -312,11 +468,49 @@ class FollowSerializer(ModelSerializer):
 
     def get_recipes_count(self, obj):
         """Достаем количество рецептов."""
-        return Recipe.objects.filter(author=obj.author).count()
+        return obj.author.recipes_count
 
     def get_is_subscribed(self, obj):
         """Проверка подписки пользователей."""
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         return Follow.objects.filter(
             user=obj.user,
             author=obj.author
         ).exists()
+
+
+class RefreshTokenSerializer(Serializer):
+    """Refresh-токен в теле запроса."""
+    refresh = CharField()
+
+    def validate_refresh(self, value):
+        """Проверяет подпись, срок и отзыв токена."""
+        try:
+            token = RefreshToken(value)
+        except TokenError as error:
+            raise ValidationError(error.args[0])
+        if is_revoked(token):
+            raise ValidationError('Токен отозван.')
+        return token
+
+
+class RecipeIdsSerializer(Serializer):
+    """Список id рецептов для пакетных операций."""
+    recipes = ListField(
+        child=IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BULK_RECIPES_LIMIT
+    )
+
+    def validate_recipes(self, value):
+        """Убирает повторы, сохраняя порядок."""
+        return list(dict.fromkeys(value))
+
+
+class ServingsSerializer(ModelSerializer):
+    """Число порций рецепта в списке покупок."""
+
+    class Meta:
+        model = ShoppingCart
+        fields = ('servings',)
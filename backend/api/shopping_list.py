@@ -0,0 +1,99 @@
+import csv
+import json
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+from .pdf import render_pdf
+
+TITLE = 'Список покупок:'
+CSV_HEADER = ('Ингредиент', 'Количество', 'Единица измерения')
+
+
+def normalize_amount(amount):
+    """Количество без лишних знаков: 1500.0 -> 1500, 0.25 -> 0.25."""
+    amount = round(amount, 3)
+    return int(amount) if amount == int(amount) else amount
+
+
+class Echo:
+    """Псевдобуфер для csv.writer: возвращает записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+class ShoppingListTextRenderer(BaseRenderer):
+    """Список покупок в виде текста."""
+    media_type = 'text/plain'
+    format = 'txt'
+    charset = 'utf-8'
+
+    def stream(self, rows):
+        """Построчно отдает список покупок."""
+        yield f'{TITLE}\n'
+        for name, measure, amount in rows:
+            yield f'{name} {amount} {measure},\n'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        """Отрисовывает ошибки и список покупок целиком."""
+        if isinstance(data, dict):
+            return '\n'.join(
+                f'{key}: {value}' for key, value in data.items()
+            ).encode(self.charset)
+        return ''.join(self.stream(data)).encode(self.charset)
+
+
+class ShoppingListCSVRenderer(ShoppingListTextRenderer):
+    """Список покупок в формате CSV."""
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def stream(self, rows):
+        """Построчно отдает список покупок."""
+        writer = csv.writer(Echo())
+        yield writer.writerow(CSV_HEADER)
+        for name, measure, amount in rows:
+            yield writer.writerow((name, amount, measure))
+
+
+class ShoppingListPDFRenderer(ShoppingListTextRenderer):
+    """Список покупок в формате PDF со встроенным шрифтом."""
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+
+    def stream(self, rows):
+        """Отдает документ одним куском: reportlab пишет таблицу
+        смещений и подмножество шрифта после раскладки всех строк."""
+        yield render_pdf(TITLE, [
+            f'{name} {amount} {measure}' for name, measure, amount in rows
+        ])
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        """Отрисовывает ошибки и список покупок целиком."""
+        if isinstance(data, dict):
+            return render_pdf('Ошибка', [
+                f'{key}: {value}' for key, value in data.items()
+            ])
+        return b''.join(self.stream(data))
+
+
+class ShoppingListJSONRenderer(JSONRenderer):
+    """Список покупок в формате JSON."""
+    charset = 'utf-8'
+
+    def stream(self, rows):
+        """Отдает JSON-массив по одному элементу."""
+        yield '['
+        separator = ''
+        for name, measure, amount in rows:
+            yield separator + json.dumps(
+                {
+                    'name': name,
+                    'measurement_unit': measure,
+                    'amount': amount,
+                },
+                ensure_ascii=False
+            )
+            separator = ','
+        yield ']'
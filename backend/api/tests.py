@@ -0,0 +1,129 @@
+from unittest import mock
+
+import jwt
+from django.core.cache import cache
+from django.test import override_settings
+from django.urls import include, path
+from rest_framework.test import APITestCase
+from rest_framework.views import APIView
+
+from api.authentication import (
+    CachedTokenAuthentication, StatelessJWTAuthentication
+)
+from api.views import JWTLoginView, JWTLogoutView, JWTRefreshView
+from users.models import User
+
+# Вход по JWT подключается в api.urls только при AUTH_MODE=jwt,
+# поэтому тесты задают адреса сами.
+urlpatterns = [
+    path('api/auth/token/login/', JWTLoginView.as_view()),
+    path('api/auth/token/refresh/', JWTRefreshView.as_view()),
+    path('api/auth/token/logout/', JWTLogoutView.as_view()),
+    path('api/', include('api.urls')),
+]
+
+EMAIL = 'cook@example.com'
+PASSWORD = 'Sup3r-secret-pass'
+ME_URL = '/api/users/me/'
+
+
+@override_settings(ROOT_URLCONF=__name__, AUTH_MODE='jwt')
+class JWTAuthenticationTests(APITestCase):
+    """Вход, обновление, выход и отзыв JWT."""
+
+    def setUp(self):
+        cache.clear()
+        # Классы аутентификации берутся представлениями при импорте,
+        # поэтому режим jwt включается подменой у базового класса.
+        patcher = mock.patch.object(
+            APIView, 'authentication_classes',
+            [StatelessJWTAuthentication, CachedTokenAuthentication]
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = User.objects.create_user(
+            username='cook', email=EMAIL, password=PASSWORD,
+            first_name='Иван', last_name='Поваров'
+        )
+
+    def login(self):
+        response = self.client.post(
+            '/api/auth/token/login/',
+            {'email': EMAIL, 'password': PASSWORD}
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def get_me(self, access):
+        return self.client.get(
+            ME_URL, HTTP_AUTHORIZATION=f'Bearer {access}'
+        )
+
+    def test_login(self):
+        tokens = self.login()
+        self.assertEqual(tokens['auth_token'], tokens['access'])
+        response = self.get_me(tokens['access'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['email'], EMAIL)
+
+    def test_login_wrong_password(self):
+        response = self.client.post(
+            '/api/auth/token/login/',
+            {'email': EMAIL, 'password': 'wrong'}
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_refresh(self):
+        tokens = self.login()
+        response = self.client.post(
+            '/api/auth/token/refresh/', {'refresh': tokens['refresh']}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.get_me(response.data['access']).status_code,
+                         200)
+
+    def test_logout_revokes_tokens(self):
+        tokens = self.login()
+        response = self.client.post(
+            '/api/auth/token/logout/', {'refresh': tokens['refresh']},
+            HTTP_AUTHORIZATION=f'Bearer {tokens["access"]}'
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.get_me(tokens['access']).status_code, 401)
+        response = self.client.post(
+            '/api/auth/token/refresh/', {'refresh': tokens['refresh']}
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_password_change_revokes_tokens(self):
+        tokens = self.login()
+        self.user.set_password('An0ther-secret-pass')
+        self.user.save()
+        self.assertEqual(self.get_me(tokens['access']).status_code, 401)
+
+    def test_deactivation_revokes_tokens(self):
+        tokens = self.login()
+        self.user.is_active = False
+        self.user.save(update_fields=['is_active'])
+        self.assertEqual(self.get_me(tokens['access']).status_code, 401)
+
+    def test_privilege_change_revokes_tokens(self):
+        tokens = self.login()
+        self.user.is_staff = True
+        self.user.save(update_fields=['is_staff'])
+        self.assertEqual(self.get_me(tokens['access']).status_code, 401)
+        self.assertEqual(self.get_me(self.login()['access']).status_code,
+                         200)
+
+    def test_profile_change_keeps_tokens(self):
+        tokens = self.login()
+        self.user.first_name = 'Петр'
+        self.user.save()
+        self.assertEqual(self.get_me(tokens['access']).status_code, 200)
+
+    def test_forged_signature(self):
+        access = self.login()['access']
+        payload = jwt.decode(access, options={'verify_signature': False})
+        payload['is_superuser'] = True
+        forged = jwt.encode(payload, 'not-the-key', algorithm='HS256')
+        self.assertEqual(self.get_me(forged).status_code, 401)
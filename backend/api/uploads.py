@@ -0,0 +1,81 @@
+import json
+
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.utils.datastructures import MultiValueDict
+from rest_framework import status
+from rest_framework.exceptions import APIException, ParseError
+from rest_framework.parsers import DataAndFiles, MultiPartParser
+
+
+class ImageTooLarge(APIException):
+    """Картинка больше допустимого размера."""
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Файл картинки слишком большой.'
+    default_code = 'image_too_large'
+
+
+class LimitedTemporaryFileUploadHandler(TemporaryFileUploadHandler):
+    """Пишет файлы из запроса во временные файлы на диске
+    и обрывает загрузку, как только превышен RECIPE_IMAGE_MAX_SIZE."""
+
+    def handle_raw_input(self, input_data, meta, content_length, boundary,
+                         encoding=None):
+        """Отклоняет запрос по Content-Length до чтения тела."""
+        limit = (
+            settings.RECIPE_IMAGE_MAX_SIZE
+            + settings.DATA_UPLOAD_MAX_MEMORY_SIZE
+        )
+        if content_length > limit:
+            raise ImageTooLarge()
+
+    def receive_data_chunk(self, raw_data, start):
+        """Записывает очередной кусок файла."""
+        if start + len(raw_data) > settings.RECIPE_IMAGE_MAX_SIZE:
+            self.upload_interrupted()
+            raise ImageTooLarge()
+        return super().receive_data_chunk(raw_data, start)
+
+
+class FormData(dict):
+    """Поля формы по одному значению на ключ.
+
+    DRF объединяет поля с файлами через copy() и update(), файлы
+    из MultiValueDict должны попасть по одному, а не списками.
+    """
+
+    def copy(self):
+        return FormData(self)
+
+    def update(self, other):
+        if isinstance(other, MultiValueDict):
+            other = other.dict()
+        super().update(other)
+
+
+class RecipeMultiPartParser(MultiPartParser):
+    """multipart/form-data для рецептов.
+
+    Файлы пишутся на диск по мере чтения. Составные поля ingredients
+    и tags передаются JSON-массивом или повторяющимся полем.
+    """
+    json_fields = ('ingredients', 'tags')
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        """Разбирает форму и декодирует составные поля."""
+        request = parser_context['request']
+        request.upload_handlers = [LimitedTemporaryFileUploadHandler(request)]
+        parsed = super().parse(stream, media_type, parser_context)
+        data = FormData()
+        for key, values in parsed.data.lists():
+            if key not in self.json_fields:
+                data[key] = values[-1]
+                continue
+            try:
+                decoded = [json.loads(value) for value in values]
+            except ValueError:
+                raise ParseError(f'Поле {key} должно быть в JSON.')
+            if len(decoded) == 1 and isinstance(decoded[0], list):
+                decoded = decoded[0]
+            data[key] = decoded
+        return DataAndFiles(data, parsed.files)
@@ -1,7 +1,12 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from .views import IngredientViewSet, RecipeViewSet, TagViewSet, UsersViewSet
+from .async_views import threaded_patterns
+from .views import (
+    IngredientViewSet, JWTLoginView, JWTLogoutView, JWTRefreshView,
+    RecipeViewSet, TagViewSet, UsersViewSet
+)
 
 app_name = 'api'
 
@@ -29,7 +34,19 @@ router.register(
 )
 
 
+router_urls = router.urls
+if settings.SERVER_MODE == 'asgi':
+    router_urls = threaded_patterns(router_urls)
+
+auth_urls = 'djoser.urls.authtoken'
+if settings.AUTH_MODE == 'jwt':
+    auth_urls = [
+        path('token/login/', JWTLoginView.as_view(), name='login'),
+        path('token/refresh/', JWTRefreshView.as_view(), name='refresh'),
+        path('token/logout/', JWTLogoutView.as_view(), name='logout'),
+    ]
+
 urlpatterns = [
-    path('', include(router.urls)),
-    path('auth/', include('djoser.urls.authtoken')),
+    path('', include(router_urls)),
+    path('auth/', include(auth_urls)),
 ]
@@ -1,29 +1,61 @@
-from django.db.models import Sum
-from django.http import HttpResponse
+import hashlib
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.auth.signals import user_logged_in, user_logged_out
+from django.db import transaction
+from django.db.models import (
+    BooleanField, Count, Exists, ExpressionWrapper, F, FloatField, Max,
+    OuterRef, Subquery, Sum, Value
+)
+from django.db.models.functions import Coalesce
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
 from django_filters.rest_framework import DjangoFilterBackend
+from djoser.conf import settings as djoser_settings
 from djoser.views import UserViewSet
 from rest_framework import filters, permissions, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.parsers import JSONParser
 from rest_framework.generics import get_object_or_404
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework_simplejwt.tokens import AccessToken
 from users.models import Follow, User
 
+from .authentication import access_for, issue_tokens, revoke_token
 from .filters import IngredientSearchFilter, RecipesFilter
-from .pagination import LimitPagePagination
+from .db import primary_reads
+from .instrumentation import InstrumentedViewMixin
+from .mixins import CachedListMixin, ReplicaReadMixin
+from .pagination import CursorPaginationMixin, LimitPagePagination
 from .permissions import IsAuthorOrReadOnly
+from .uploads import RecipeMultiPartParser
+from .shopping_list import (
+    ShoppingListCSVRenderer, ShoppingListJSONRenderer,
+    ShoppingListPDFRenderer, ShoppingListTextRenderer, normalize_amount
+)
 from .serializers import (
     FollowSerializer, IngredientSerializer,
     RecipeCreateSerializer, RecipeForFollowersSerializer,
-    RecipeSerializer, TagSerializer, UsersSerializer
+    RecipeIdsSerializer, RecipeSerializer, RefreshTokenSerializer,
+    ServingsSerializer, TagSerializer, UsersSerializer,
+    get_recipes_limit
 )
+from recipes.cache import INGREDIENTS_VERSION, TAGS_VERSION
+from recipes.counters import raw_delete, recount_recipe_counter
+from recipes.index import ingredient_index
 from recipes.models import (
     AmountIngredients, Favorite, Ingredient,
-    Recipe, ShoppingCart, Tag
+    Recipe, ShoppingCart, Tag, UnitConversion
 )
 
 
-class UsersViewSet(UserViewSet):
+class UsersViewSet(InstrumentedViewMixin, ReplicaReadMixin,
+                   CursorPaginationMixin, UserViewSet):
     """Вьюсет для модели пользователей"""
     queryset = User.objects.all()
     serializer_class = UsersSerializer
@@ -38,6 +70,18 @@ class UsersViewSet(UserViewSet):
     )
     permission_classes = (AllowAny, )
 
+    def get_queryset(self):
+        """Аннотирует признак подписки текущего пользователя."""
+        queryset = super().get_queryset()
+        if self.request.user.is_anonymous:
+            return queryset
+        return queryset.annotate(is_subscribed=Exists(
+            Follow.objects.filter(
+                user=self.request.user,
+                author=OuterRef('pk')
+            )
+        ))
+
     def subscribed(self, serializer, id=None):
         """Создает подписку на автора."""
         follower = get_object_or_404(User, id=id)
@@ -46,7 +90,10 @@ class UsersViewSet(UserViewSet):
                             status=status.HTTP_400_BAD_REQUEST)
         follow = Follow.objects.get_or_create(user=self.request.user,
                                               author=follower)
-        serializer = FollowSerializer(follow[0])
+        serializer = FollowSerializer(
+            follow[0],
+            context=self.get_serializer_context()
+        )
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def unsubscribed(self, serializer, id=None):
@@ -71,22 +118,42 @@ class UsersViewSet(UserViewSet):
             permission_classes=[permissions.IsAuthenticated])
     def subscriptions(self, serializer):
         """Список подписок пользоваетеля."""
-        following = Follow.objects.filter(user=self.request.user)
+        following = Follow.objects.filter(
+            user=self.request.user
+        ).select_related('author').annotate(
+            is_subscribed=Value(True, output_field=BooleanField())
+        )
         pages = self.paginate_queryset(following)
-        serializer = FollowSerializer(pages, many=True)
+        previews = defaultdict(list)
+        for recipe in Recipe.objects.latest_by_author(
+            {follow.author_id for follow in pages},
+            get_recipes_limit(self.request)
+        ):
+            previews[recipe.author_id].append(recipe)
+        for follow in pages:
+            follow.recipes_preview = previews[follow.author_id]
+        serializer = FollowSerializer(
+            pages,
+            many=True,
+            context=self.get_serializer_context()
+        )
         return self.get_paginated_response(serializer.data)
 
 
-class TagViewSet(viewsets.ModelViewSet):
+class TagViewSet(InstrumentedViewMixin, ReplicaReadMixin, CachedListMixin,
+                 viewsets.ModelViewSet):
     """Вьюсет для модели тэгов."""
+    cache_version_name = TAGS_VERSION
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
     permission_classes = (IsAuthorOrReadOnly,)
 
 
-class IngredientViewSet(viewsets.ModelViewSet):
+class IngredientViewSet(InstrumentedViewMixin, ReplicaReadMixin,
+                        CachedListMixin, viewsets.ModelViewSet):
     """Вьюсет для модели ингредиентов."""
+    cache_version_name = INGREDIENTS_VERSION
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     permission_classes = (IsAuthorOrReadOnly,)
@@ -94,20 +161,44 @@ class IngredientViewSet(viewsets.ModelViewSet):
     filter_backends = (IngredientSearchFilter,)
     search_fields = ('^name',)
 
+    def list(self, request, *args, **kwargs):
+        """Поиск по названию обслуживается индексом в памяти."""
+        name = request.query_params.get(IngredientSearchFilter.search_param)
+        if name:
+            # Снимок индекса живет до следующей версии, как и кэш.
+            with primary_reads():
+                return Response(ingredient_index.search(name))
+        return super().list(request, *args, **kwargs)
 
-class RecipeViewSet(viewsets.ModelViewSet):
+
+class RecipeViewSet(InstrumentedViewMixin, ReplicaReadMixin,
+                    CursorPaginationMixin, viewsets.ModelViewSet):
     """Вьюсет для рецептов"""
     queryset = Recipe.objects.all()
     permission_classes = [IsAuthorOrReadOnly]
     pagination_class = LimitPagePagination
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipesFilter
+    parser_classes = (JSONParser, RecipeMultiPartParser)
+
+    def get_queryset(self):
+        """Для чтения подгружает связанные данные и признаки
+        пользователя одним набором запросов на страницу."""
+        if self.action in ('list', 'retrieve'):
+            return Recipe.objects.with_related().with_user_flags(
+                self.request.user
+            )
+        if self.action == 'feed':
+            return Recipe.objects.feed_for(
+                self.request.user
+            ).with_related().with_user_flags(self.request.user)
+        return Recipe.objects.all()
 
     def get_serializer_class(self):
         """Метод выбора сериализатора в зависимости от запроса."""
         if self.action == 'list':
             return RecipeSerializer
-        if self.action == 'retrieve':
+        if self.action in ('retrieve', 'feed'):
             return RecipeSerializer
         return RecipeCreateSerializer
 
@@ -119,6 +210,20 @@ class RecipeViewSet(viewsets.ModelViewSet):
         """Метод обновления параметров автора при создании рецепта."""
         serializer.save(author=self.request.user)
 
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=[IsAuthenticated]
+    )
+    def feed(self, request):
+        """Лента рецептов авторов из подписок, всегда с курсором."""
+        paginator = self.cursor_pagination_class()
+        page = paginator.paginate_queryset(
+            self.get_queryset(), request, view=self
+        )
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
     @action(
         detail=True,
         methods=['post', 'delete'],
@@ -133,23 +238,112 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
     @action(
         detail=True,
-        methods=['post', 'delete'],
+        methods=['post', 'patch', 'delete'],
         permission_classes=[IsAuthenticated]
     )
     def shopping_cart(self, request, pk):
-        """Добавление рецепта в список покупок"""
-        if request.method == 'POST':
-            return self.add_to(ShoppingCart, request.user, pk)
-        else:
+        """Добавление рецепта в список покупок и изменение числа порций"""
+        if request.method == 'DELETE':
             return self.delete_from(ShoppingCart, request.user, pk)
+        serializer = ServingsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        if request.method == 'POST':
+            return self.add_to(
+                ShoppingCart, request.user, pk, **serializer.validated_data
+            )
+        entry = get_object_or_404(
+            ShoppingCart, user=request.user, recipe_id=pk
+        )
+        serializer.update(entry, serializer.validated_data)
+        return Response({'id': entry.recipe_id, 'servings': entry.servings})
+
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        permission_classes=[IsAuthenticated],
+        url_path='favorite',
+        url_name='favorite-bulk'
+    )
+    def favorite_bulk(self, request):
+        """Добавление и удаление нескольких рецептов в избранном."""
+        return self.bulk_change(Favorite, request)
+
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        permission_classes=[IsAuthenticated],
+        url_path='shopping_cart',
+        url_name='shopping-cart-bulk'
+    )
+    def shopping_cart_bulk(self, request):
+        """Добавление и удаление нескольких рецептов в списке покупок."""
+        return self.bulk_change(ShoppingCart, request)
+
+    @action(
+        detail=False,
+        methods=['delete'],
+        permission_classes=[IsAuthenticated],
+        url_path='shopping_cart/clear',
+        url_name='shopping-cart-clear'
+    )
+    def clear_shopping_cart(self, request):
+        """Очистка списка покупок одним DELETE."""
+        with transaction.atomic():
+            entries = ShoppingCart.objects.filter(user=request.user)
+            recipe_ids = list(entries.values_list('recipe_id', flat=True))
+            raw_delete(entries)
+            recount_recipe_counter(ShoppingCart, recipe_ids)
+        return Response({'deleted': len(recipe_ids)})
+
+    def bulk_change(self, model, request):
+        """Пакетная операция над списком id рецептов.
+
+        Отвечает статусом каждого id: added, exists, deleted,
+        missing или not_found для несуществующего рецепта.
+        """
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data['recipes']
+        with transaction.atomic():
+            found = Recipe.objects.only('id').in_bulk(ids)
+            entries = model.objects.filter(
+                user=request.user, recipe_id__in=list(found)
+            )
+            present = set(entries.values_list('recipe_id', flat=True))
+            if request.method == 'POST':
+                changed = [pk for pk in found if pk not in present]
+                model.objects.bulk_create(
+                    (model(user=request.user, recipe_id=pk)
+                     for pk in changed),
+                    ignore_conflicts=True
+                )
+                statuses = 'added', 'exists'
+            else:
+                changed = list(present)
+                raw_delete(entries)
+                statuses = 'deleted', 'missing'
+            # Пакетные операции не отправляют сигналы моделей.
+            recount_recipe_counter(model, list(found))
+        changed = set(changed)
+        return Response({'results': [
+            {
+                'id': pk,
+                'status': (
+                    'not_found' if pk not in found
+                    else statuses[0] if pk in changed
+                    else statuses[1]
+                ),
+            }
+            for pk in ids
+        ]})
 
-    def add_to(self, model, user, pk):
+    def add_to(self, model, user, pk, **fields):
         """Метод добавления рецепта"""
         if model.objects.filter(user=user, recipe__id=pk).exists():
             return Response({'errors': 'Рецепт уже добавлен!'},
                             status=status.HTTP_400_BAD_REQUEST)
         recipe = get_object_or_404(Recipe, id=pk)
-        model.objects.create(user=user, recipe=recipe)
+        model.objects.create(user=user, recipe=recipe, **fields)
         serializer = RecipeForFollowersSerializer(recipe)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
@@ -162,25 +356,158 @@ class RecipeViewSet(viewsets.ModelViewSet):
         return Response({'errors': 'Рецепт уже удален!'},
                         status=status.HTTP_400_BAD_REQUEST)
 
-    @action(detail=False, methods=['get'])
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=[IsAuthenticated],
+        renderer_classes=[
+            ShoppingListTextRenderer,
+            ShoppingListCSVRenderer,
+            ShoppingListJSONRenderer,
+            ShoppingListPDFRenderer,
+        ]
+    )
     def download_shopping_cart(self, request):
-        """Загружает файл *.txt co списком покупок."""
-        user = request.user
-        ingredients = AmountIngredients.objects.filter(
-            recipe__shopping_cart__user=user).values(
-                'ingredients__name',
-                'ingredients__measurement_unit').annotate(
-                    amount=Sum('amount'))
-        data = ingredients.values_list(
-            'ingredients__name',
-            'ingredients__measurement_unit',
-            'amount'
+        """Потоково выгружает список покупок в формате txt, csv, json
+        или pdf.
+
+        Формат выбирается параметром ?format= или заголовком Accept.
+        Количества умножаются на число порций и переводятся в базовые
+        единицы по UnitConversion в одном запросе с группировкой.
+        """
+        renderer = request.accepted_renderer
+        state = ShoppingCart.objects.filter(user=request.user).aggregate(
+            count=Count('id'),
+            last_id=Max('id'),
+            cart_updated=Max('updated'),
+            updated=Max('recipe__updated'),
         )
-        shopping_cart = 'Список покупок:\n'
-        for name, measure, amount in data:
-            shopping_cart += (f'{name} {amount} {measure},\n')
-        response = HttpResponse(
-            shopping_cart,
-            content_type='text/plain'
+        units = UnitConversion.objects.aggregate(
+            count=Count('id'),
+            updated=Max('updated'),
         )
+        etag = quote_etag(hashlib.md5(
+            f'{renderer.format}:{state["count"]}:{state["last_id"]}:'
+            f'{state["cart_updated"]}:{state["updated"]}:'
+            f'{units["count"]}:{units["updated"]}'.encode()
+        ).hexdigest())
+        # Last-Modified не отдается: удаление позиции из корзины не
+        # сдвигает ни одну дату, а ETag учитывает число позиций.
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            conversion = UnitConversion.objects.filter(
+                unit=OuterRef('ingredients__measurement_unit')
+            )
+            rows = AmountIngredients.objects.filter(
+                recipe__shopping_cart__user=request.user
+            ).annotate(
+                unit=Coalesce(
+                    Subquery(conversion.values('base_unit')),
+                    F('ingredients__measurement_unit')
+                )
+            ).values(
+                'ingredients__name',
+                'unit'
+            ).annotate(
+                total=Sum(ExpressionWrapper(
+                    F('amount')
+                    * F('recipe__shopping_cart__servings')
+                    * Coalesce(
+                        Subquery(conversion.values('factor')), Value(1.0)
+                    ),
+                    output_field=FloatField()
+                ))
+            ).order_by(
+                'ingredients__name',
+                'unit'
+            ).values_list(
+                'ingredients__name',
+                'unit',
+                'total'
+            )
+            rows = (
+                (name, unit, normalize_amount(total))
+                for name, unit, total in rows.iterator()
+            )
+            content_type = renderer.media_type
+            if renderer.charset:
+                content_type += f'; charset={renderer.charset}'
+            if settings.SERVER_MODE == 'asgi':
+                # Под ASGI потоковый ответ перебирается в цикле событий,
+                # где запросы к базе запрещены, поэтому список
+                # собирается целиком в потоке представления.
+                response = HttpResponse(
+                    renderer.stream(rows), content_type=content_type
+                )
+            else:
+                response = StreamingHttpResponse(
+                    renderer.stream(rows), content_type=content_type
+                )
+            response['Content-Disposition'] = (
+                f'attachment; filename="shopping_list.{renderer.format}"'
+            )
+        response['ETag'] = etag
         return response
+
+
+class JWTLoginView(APIView):
+    """Вход по email и паролю с выдачей JWT."""
+    authentication_classes = ()
+    permission_classes = (AllowAny,)
+
+    def post(self, request):
+        """Выдает токен доступа и refresh-токен.
+
+        auth_token повторяет токен доступа для клиентов старого входа.
+        """
+        serializer = djoser_settings.SERIALIZERS.token_create(
+            data=request.data, context={'request': request}
+        )
+        serializer.is_valid(raise_exception=True)
+        user = serializer.user
+        user_logged_in.send(sender=User, request=request, user=user)
+        refresh, access = issue_tokens(user)
+        return Response({
+            'auth_token': str(access),
+            'access': str(access),
+            'refresh': str(refresh),
+        })
+
+
+class JWTRefreshView(APIView):
+    """Новый токен доступа по refresh-токену."""
+    authentication_classes = ()
+    permission_classes = (AllowAny,)
+
+    def post(self, request):
+        """Перечитывает пользователя, чтобы обновить поля в токене."""
+        serializer = RefreshTokenSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        refresh = serializer.validated_data['refresh']
+        user = User.objects.filter(
+            pk=refresh['user_id'], is_active=True
+        ).first()
+        if user is None:
+            raise AuthenticationFailed('Пользователь не найден.')
+        access = access_for(refresh, user)
+        return Response({'auth_token': str(access), 'access': str(access)})
+
+
+class JWTLogoutView(APIView):
+    """Выход: отзыв текущего токена доступа и refresh-токена."""
+    permission_classes = (IsAuthenticated,)
+
+    def post(self, request):
+        """refresh-токен в теле необязателен."""
+        if isinstance(request.auth, AccessToken):
+            revoke_token(request.auth)
+        if 'refresh' in request.data:
+            serializer = RefreshTokenSerializer(data=request.data)
+            if (
+                serializer.is_valid()
+                and serializer.validated_data['refresh']['user_id']
+                == request.user.pk
+            ):
+                revoke_token(serializer.validated_data['refresh'])
+        user_logged_out.send(sender=User, request=request, user=request.user)
+        return Response(status=status.HTTP_204_NO_CONTENT)
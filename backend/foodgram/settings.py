@@ -1,6 +1,9 @@
 import os
+from datetime import timedelta
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 SECRET_KEY = os.getenv('SECRET_KEY', default='token')
@@ -28,6 +31,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.instrumentation.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -39,6 +43,40 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'foodgram.urls'
 
+# Замеры запросов: заголовок Server-Timing, метрики /metrics
+# в формате Prometheus и JSON-лог api.instrumentation.
+PERFORMANCE_SERVER_TIMING = (
+    os.getenv('PERFORMANCE_SERVER_TIMING', default='False') == 'True'
+)
+PERFORMANCE_METRICS = os.getenv('PERFORMANCE_METRICS', default='False') == 'True'
+PERFORMANCE_LOG = os.getenv('PERFORMANCE_LOG', default='False') == 'True'
+
+# Поиск повторяющихся (N+1) и медленных запросов к базе:
+# off, log, warn или raise.
+QUERY_DETECTOR = os.getenv('QUERY_DETECTOR', default='off')
+QUERY_DETECTOR_REPEATS = int(os.getenv('QUERY_DETECTOR_REPEATS', default=5))
+QUERY_DETECTOR_SLOW_MS = int(os.getenv('QUERY_DETECTOR_SLOW_MS', default=100))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'message',
+        },
+    },
+    'loggers': {
+        'api': {
+            'handlers': ['console'],
+            'level': os.getenv('API_LOG_LEVEL', default='INFO'),
+        },
+    },
+}
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -57,6 +95,12 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'foodgram.wsgi.application'
 
+ASGI_APPLICATION = 'foodgram.asgi.application'
+
+SERVER_MODE = os.getenv('SERVER_MODE', default='wsgi')
+
+SERVER_THREADS = int(os.getenv('SERVER_THREADS', default=4))
+
 
 DATABASES = {
     'default': {
@@ -65,10 +109,72 @@ DATABASES = {
         'USER': os.getenv('POSTGRES_USER', default='postgres'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', default='postgres'),
         'HOST': os.getenv('DB_HOST', default='db'),
-        'PORT': os.getenv('DB_PORT', default='5432')
+        'PORT': os.getenv('DB_PORT', default='5432'),
+        # Постоянные соединения: 0 - закрывать после каждого запроса,
+        # None - держать без ограничения по времени.
+        'CONN_MAX_AGE': (
+            None if os.getenv('DB_CONN_MAX_AGE') == 'None'
+            else int(os.getenv('DB_CONN_MAX_AGE', default=60))
+        ),
+        # pgbouncer в режиме transaction не сохраняет курсоры
+        # между транзакциями.
+        'DISABLE_SERVER_SIDE_CURSORS': (
+            os.getenv('DB_PGBOUNCER', default='False') == 'True'
+        ),
+    }
+}
+
+# Реплики для чтения: адреса серверов PostgreSQL через запятую,
+# для SQLite - пути к файлам баз.
+DB_REPLICA_ALIASES = []
+for number, replica in enumerate(
+    filter(None, os.getenv('DB_REPLICAS', default='').split(',')), start=1
+):
+    alias = f'replica{number}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    if DATABASES[alias]['ENGINE'].endswith('sqlite3'):
+        DATABASES[alias]['NAME'] = replica
+    else:
+        DATABASES[alias]['HOST'] = replica
+    DB_REPLICA_ALIASES.append(alias)
+
+DATABASE_ROUTERS = ['api.db.ReplicaRouter']
+
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', default=10))
+
+DB_HEALTH_CHECK_INTERVAL = int(
+    os.getenv('DB_HEALTH_CHECK_INTERVAL', default=30)
+)
+
+
+# Для нескольких воркеров нужен общий кэш (файловый или memcached),
+# иначе версии справочников у каждого процесса свои.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', default='foodgram'),
     }
 }
 
+# Общий для всех процессов кэш: не в памяти процесса и не заглушка.
+SHARED_CACHE = CACHES['default']['BACKEND'] not in (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+# Закрепление за основной базой после записи хранится в кэше;
+# в памяти одного процесса другие воркеры его не увидят.
+if DB_REPLICA_ALIASES and not SHARED_CACHE:
+    raise ImproperlyConfigured(
+        'DB_REPLICAS требует общего кэша: задайте CACHE_BACKEND '
+        'и CACHE_LOCATION.'
+    )
+
+REFERENCE_CACHE_TIMEOUT = int(os.getenv('REFERENCE_CACHE_TIMEOUT', default=3600))
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -105,17 +211,91 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+THUMBNAIL_WORKERS = int(os.getenv('THUMBNAIL_WORKERS', default=2))
+
+RECIPE_IMAGE_MAX_SIZE = int(
+    os.getenv('RECIPE_IMAGE_MAX_SIZE', default=10 * 1024 * 1024)
+)
+RECIPE_IMAGE_MAX_DIMENSION = int(
+    os.getenv('RECIPE_IMAGE_MAX_DIMENSION', default=6000)
+)
+
 AUTH_USER_MODEL = 'users.User'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
 }
 
+# token - токены djoser в базе, jwt - подписанные токены без запроса
+# к базе; старые токены в режиме jwt продолжают работать.
+AUTH_MODE = os.getenv('AUTH_MODE', default='token')
+# Ключ подписи JWT, отдельный от SECRET_KEY.
+JWT_SIGNING_KEY = os.getenv('JWT_SIGNING_KEY')
+if AUTH_MODE == 'jwt':
+    if not JWT_SIGNING_KEY or JWT_SIGNING_KEY == 'token':
+        raise ImproperlyConfigured(
+            'AUTH_MODE=jwt требует собственного ключа JWT_SIGNING_KEY.'
+        )
+    # Отозванные токены хранятся в кэше и должны быть видны всем
+    # воркерам и узлам.
+    if not SHARED_CACHE:
+        raise ImproperlyConfigured(
+            'AUTH_MODE=jwt требует общего кэша: задайте CACHE_BACKEND '
+            'и CACHE_LOCATION.'
+        )
+    REST_FRAMEWORK['DEFAULT_AUTHENTICATION_CLASSES'].insert(
+        0, 'api.authentication.StatelessJWTAuthentication'
+    )
+
+SIMPLE_JWT = {
+    'ACCESS_TOKEN_LIFETIME': timedelta(
+        minutes=int(os.getenv('JWT_ACCESS_MINUTES', default=15))
+    ),
+    'REFRESH_TOKEN_LIFETIME': timedelta(
+        days=int(os.getenv('JWT_REFRESH_DAYS', default=7))
+    ),
+    'AUTH_HEADER_TYPES': ('Bearer', 'Token'),
+    'SIGNING_KEY': JWT_SIGNING_KEY or SECRET_KEY,
+}
+
+# Сколько секунд пользователь токена хранится в кэше; 0 - не кэшировать.
+# С кэшем в памяти процесса выход и смену пароля увидел бы только
+# один воркер, поэтому по умолчанию кэш токенов включен лишь с общим.
+TOKEN_CACHE_TIMEOUT = int(
+    os.getenv('TOKEN_CACHE_TIMEOUT', default=60 if SHARED_CACHE else 0)
+)
+
+# Больше скольких рецептов автора не отдавать в подписках
+# при любом значении recipes_limit.
+RECIPES_LIMIT_MAX = int(os.getenv('RECIPES_LIMIT_MAX', default=20))
+
+# Сколько рецептов можно передать в одном пакетном запросе.
+BULK_RECIPES_LIMIT = int(os.getenv('BULK_RECIPES_LIMIT', default=100))
+
+# Поиск рецептов: auto - по базе данных, postgres - полнотекстовый
+# с триграммами, like - LIKE по названию, описанию и ингредиентам.
+RECIPE_SEARCH_ENGINE = os.getenv('RECIPE_SEARCH_ENGINE', default='auto')
+
+INGREDIENT_SEARCH_LIMIT = int(os.getenv('INGREDIENT_SEARCH_LIMIT', default=50))
+
+TRENDING_HALF_LIFE_HOURS = float(
+    os.getenv('TRENDING_HALF_LIFE_HOURS', default=48)
+)
+
+# Авторы с таким числом подписчиков не раскладывают рецепты по лентам,
+# их рецепты выбираются при чтении ленты.
+FEED_CELEBRITY_FOLLOWERS = int(
+    os.getenv('FEED_CELEBRITY_FOLLOWERS', default=1000)
+)
+FEED_BATCH_SIZE = int(os.getenv('FEED_BATCH_SIZE', default=1000))
+# Сколько последних рецептов автора попадает в ленту при подписке.
+FEED_FOLLOW_RECIPES = int(os.getenv('FEED_FOLLOW_RECIPES', default=50))
+
 DJOSER = {
     'LOGIN_FIELD': 'email',
     'HIDE_USERS': False,
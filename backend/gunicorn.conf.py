@@ -0,0 +1,19 @@
+import os
+
+mode = os.getenv('SERVER_MODE', default='wsgi')
+
+bind = os.getenv('SERVER_BIND', default='0:8000')
+# Каждый поток каждого воркера держит свое соединение с базой
+# (DB_CONN_MAX_AGE), поэтому по умолчанию 2 * 4 = 8 соединений
+# на контейнер; больше - только в пределах max_connections PostgreSQL.
+workers = int(os.getenv('SERVER_WORKERS', default=2))
+threads = int(os.getenv('SERVER_THREADS', default=4))
+timeout = int(os.getenv('SERVER_TIMEOUT', default=30))
+keepalive = 5
+
+if mode == 'asgi':
+    wsgi_app = 'foodgram.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    wsgi_app = 'foodgram.wsgi:application'
+    worker_class = 'gthread' if threads > 1 else 'sync'
@@ -2,7 +2,7 @@ from django.contrib import admin
 
 from .models import (
     Favorite, Ingredient, Recipe,
-    AmountIngredients, ShoppingCart, Tag
+    AmountIngredients, ShoppingCart, Tag, UnitConversion
 )
 
 
@@ -57,8 +57,11 @@ class RecipeAdmin(admin.ModelAdmin):
         'tags__name'
     )
 
+    readonly_fields = ('favorites_count', 'cart_count')
+
+    @admin.display(description='В избранном')
     def count_favorites(self, obj: Recipe):
-        return obj.favorite.count()
+        return obj.favorites_count
 
 
 @admin.register(AmountIngredients)
@@ -106,7 +109,8 @@ class ShoppingCartAdmin(admin.ModelAdmin):
     list_display = (
         'id',
         'recipe',
-        'user'
+        'user',
+        'servings'
     )
     list_filter = (
         'recipe',
@@ -116,3 +120,14 @@ class ShoppingCartAdmin(admin.ModelAdmin):
         'recipe__name',
         'user__username'
     )
+
+
+@admin.register(UnitConversion)
+class UnitConversionAdmin(admin.ModelAdmin):
+    """Панель администратора для переводов единиц измерения"""
+    list_display = (
+        'unit',
+        'base_unit',
+        'factor'
+    )
+    search_fields = ('unit', 'base_unit')
@@ -5,3 +5,7 @@ class RecipesConfig(AppConfig):
     """Конфигурация для приложения Recipe."""
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'recipes'
+
+    def ready(self):
+        """Подключает обработчики сигналов."""
+        import recipes.signals  # noqa: F401
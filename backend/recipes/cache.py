@@ -0,0 +1,35 @@
+import time
+
+from django.core.cache import cache
+
+INGREDIENTS_VERSION = 'ingredients'
+TAGS_VERSION = 'tags'
+
+
+def version_key(name):
+    """Ключ версии набора данных в кэше."""
+    return f'version:{name}'
+
+
+def get_version(name):
+    """Возвращает текущую версию набора данных.
+
+    Версия хранится в общем кэше, поэтому все процессы видят одно
+    и то же значение. При потере ключа версия начинается с текущего
+    времени и не совпадает ни с одной из прежних.
+    """
+    key = version_key(name)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(name):
+    """Отмечает изменение набора данных."""
+    key = version_key(name)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), timeout=None)
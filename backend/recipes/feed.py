@@ -0,0 +1,105 @@
+from django.conf import settings
+from django.db import transaction
+
+from recipes.models import FeedEntry, Recipe
+from users.models import Follow, User
+
+
+def is_celebrity(author_id):
+    """Слишком много подписчиков, чтобы раскладывать рецепты по лентам."""
+    followers_count = User.objects.filter(pk=author_id).values_list(
+        'followers_count', flat=True
+    ).first()
+    return (followers_count or 0) >= settings.FEED_CELEBRITY_FOLLOWERS
+
+
+def save_entries(entries):
+    """Сохраняет записи ленты пачками по FEED_BATCH_SIZE и возвращает
+    их число; уже существующие пропускаются."""
+    batch = []
+    total = 0
+    for entry in entries:
+        batch.append(entry)
+        if len(batch) >= settings.FEED_BATCH_SIZE:
+            FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+            total += len(batch)
+            batch = []
+    FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+    return total + len(batch)
+
+
+def fan_out(recipe_id, author_id):
+    """Раскладывает рецепт по лентам подписчиков автора."""
+    if is_celebrity(author_id):
+        return 0
+    return save_entries(
+        FeedEntry(user_id=user_id, recipe_id=recipe_id, author_id=author_id)
+        for user_id in Follow.objects.filter(
+            author_id=author_id
+        ).values_list('user_id', flat=True).iterator(
+            chunk_size=settings.FEED_BATCH_SIZE
+        )
+    )
+
+
+def schedule_fan_out(recipe):
+    """Раскладывает рецепт по лентам после фиксации транзакции."""
+    recipe_id, author_id = recipe.pk, recipe.author_id
+    transaction.on_commit(lambda: fan_out(recipe_id, author_id))
+
+
+def latest_recipe_ids(author_id):
+    return list(Recipe.objects.filter(author_id=author_id).order_by(
+        '-id'
+    ).values_list('id', flat=True)[:settings.FEED_FOLLOW_RECIPES])
+
+
+def add_author(user_id, author_id):
+    """Добавляет в ленту последние рецепты автора после подписки."""
+    if is_celebrity(author_id):
+        return 0
+    return save_entries(
+        FeedEntry(user_id=user_id, recipe_id=recipe_id, author_id=author_id)
+        for recipe_id in latest_recipe_ids(author_id)
+    )
+
+
+def remove_author(user_id, author_id):
+    """Убирает из ленты рецепты автора после отписки."""
+    FeedEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def add_followers(author_id):
+    """Раскладывает последние рецепты автора по лентам всех его
+    подписчиков и возвращает число записей."""
+    recipe_ids = latest_recipe_ids(author_id)
+    return save_entries(
+        FeedEntry(user_id=user_id, recipe_id=recipe_id, author_id=author_id)
+        for user_id in Follow.objects.filter(
+            author_id=author_id
+        ).values_list('user_id', flat=True).iterator(
+            chunk_size=settings.FEED_BATCH_SIZE
+        )
+        for recipe_id in recipe_ids
+    )
+
+
+def follower_lost(author_id):
+    """После отписки автор мог перестать быть знаменитостью: его
+    рецепты больше не выбираются при чтении, поэтому последние из них
+    раскладываются по лентам оставшихся подписчиков."""
+    if not User.objects.filter(
+        pk=author_id,
+        followers_count=settings.FEED_CELEBRITY_FOLLOWERS - 1
+    ).exists():
+        return 0
+    return add_followers(author_id)
+
+
+def backfill():
+    """Заполняет ленты по существующим подпискам и возвращает
+    число обработанных записей."""
+    author_ids = Follow.objects.filter(
+        author__followers_count__lt=settings.FEED_CELEBRITY_FOLLOWERS
+    ).values_list('author_id', flat=True).distinct().order_by('author_id')
+    return sum(add_followers(author_id) for author_id in list(author_ids))
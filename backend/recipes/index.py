@@ -0,0 +1,75 @@
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+
+from recipes.cache import INGREDIENTS_VERSION, get_version
+from recipes.models import Ingredient
+
+
+class IngredientIndex:
+    """Индекс названий ингредиентов в памяти процесса.
+
+    Хранит отсортированный список названий и ищет по префиксу
+    бинарным поиском. Перестраивается, когда меняется версия
+    ингредиентов в кэше, и не реже раза в REFERENCE_CACHE_TIMEOUT
+    секунд: с кэшем в памяти процесса другие воркеры не видят
+    новую версию.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._built = None
+        self._data = ((), ())
+
+    def _is_fresh(self, version):
+        return version == self._version and (
+            time.monotonic() - self._built < settings.REFERENCE_CACHE_TIMEOUT
+        )
+
+    def _refresh(self):
+        """Перестраивает индекс, если ингредиенты изменились
+        или индекс устарел."""
+        version = get_version(INGREDIENTS_VERSION)
+        if self._is_fresh(version):
+            return
+        with self._lock:
+            if self._is_fresh(version):
+                return
+            items = sorted(
+                Ingredient.objects.values('id', 'name', 'measurement_unit'),
+                key=lambda item: (item['name'].lower(), item['id'])
+            )
+            self._data = (
+                tuple(item['name'].lower() for item in items),
+                tuple(items)
+            )
+            self._version = version
+            self._built = time.monotonic()
+
+    def search(self, query, limit=None):
+        """Ищет ингредиенты: сначала по началу названия,
+        затем по вхождению."""
+        self._refresh()
+        if limit is None:
+            limit = settings.INGREDIENT_SEARCH_LIMIT
+        query = query.strip().lower()
+        names, items = self._data
+        result = []
+        position = bisect_left(names, query)
+        while (position < len(names) and len(result) < limit
+               and names[position].startswith(query)):
+            result.append(items[position])
+            position += 1
+        if len(result) < limit:
+            for name, item in zip(names, items):
+                if query in name and not name.startswith(query):
+                    result.append(item)
+                    if len(result) == limit:
+                        break
+        return result
+
+
+ingredient_index = IngredientIndex()
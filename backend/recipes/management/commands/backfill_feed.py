@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from recipes.feed import backfill
+from recipes.models import FeedEntry
+
+
+class Command(BaseCommand):
+    """Заполнение лент подписчиков по существующим подпискам."""
+    help = 'Заполнение лент подписчиков'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clear', action='store_true',
+                            help='Удалить все записи лент перед заполнением.')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            if options['clear']:
+                FeedEntry.objects.all().delete()
+            total = backfill()
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано записей лент: {total}.'
+        ))
@@ -1,18 +1,106 @@
 import csv
+import json
+from pathlib import Path
 
-from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from recipes.cache import INGREDIENTS_VERSION, bump_version
 from recipes.models import Ingredient
 
+DEFAULT_FILE = settings.BASE_DIR / 'recipes' / 'data' / 'ingredients.csv'
+READ_SIZE = 64 * 1024
+
+
+def read_csv(file):
+    """Построчно читает пары (название, единица измерения) из csv."""
+    for line, row in enumerate(csv.reader(file), start=1):
+        if len(row) != 2:
+            raise CommandError(f'Строка {line}: ожидалось два поля.')
+        yield row
+
+
+def read_json(file):
+    """Потоково читает массив объектов из json, не загружая файл целиком."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    started = False
+    while True:
+        chunk = file.read(READ_SIZE)
+        buffer += chunk
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if not started and buffer[position:position + 1] == '[':
+                started = True
+                position += 1
+                continue
+            if buffer[position:position + 1] == ']':
+                return
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                break
+            yield item['name'], item['measurement_unit']
+        buffer = buffer[position:]
+        if not chunk:
+            if buffer.strip():
+                raise CommandError('Некорректный json.')
+            return
+
+
+READERS = {
+    'csv': read_csv,
+    'json': read_json,
+}
+
 
 class Command(BaseCommand):
-    """Загрузка данных в базу из csv файла."""
+    """Загрузка ингредиентов в базу из csv или json файла."""
     help = 'Загрузка базы данных'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--file', default=DEFAULT_FILE,
+                            help='Путь к файлу с ингредиентами.')
+        parser.add_argument('--format', choices=READERS,
+                            help='Формат файла; по умолчанию по расширению.')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Число записей в одном INSERT.')
+
     def handle(self, *args, **options):
-        with open('recipes/data/ingredients.csv', encoding='utf-8') as file:
-            file_reader = csv.reader(file)
-            for row in file_reader:
-                name, measurement_unit = row
-                Ingredient.objects.get_or_create(
-                    name=name,
-                    measurement_unit=measurement_unit)
+        path = Path(options['file'])
+        file_format = options['format'] or path.suffix.lstrip('.').lower()
+        if file_format not in READERS:
+            raise CommandError(f'Неизвестный формат файла: {path.name}')
+        before = Ingredient.objects.count()
+        seen = set()
+        batch = []
+        total = 0
+        with transaction.atomic(), open(path, encoding='utf-8') as file:
+            for name, measurement_unit in READERS[file_format](file):
+                total += 1
+                key = (name.strip(), measurement_unit.strip())
+                if key in seen or not all(key):
+                    continue
+                seen.add(key)
+                batch.append(
+                    Ingredient(name=key[0], measurement_unit=key[1])
+                )
+                if len(batch) >= options['batch_size']:
+                    self.save(batch, total)
+                    batch = []
+            self.save(batch, total)
+        bump_version(INGREDIENTS_VERSION)
+        created = Ingredient.objects.count() - before
+        self.stdout.write(self.style.SUCCESS(
+            f'Прочитано строк: {total}, уникальных: {len(seen)}, '
+            f'добавлено: {created}.'
+        ))
+
+    def save(self, batch, total):
+        """Сохраняет пачку, пропуская уже существующие ингредиенты."""
+        if not batch:
+            return
+        Ingredient.objects.bulk_create(batch, ignore_conflicts=True)
+        self.stdout.write(f'Обработано строк: {total}')
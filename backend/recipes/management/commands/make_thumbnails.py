@@ -0,0 +1,58 @@
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from recipes.models import Recipe
+from recipes.thumbnails import (
+    get_executor, render_thumbnails, save_thumbnails
+)
+
+
+class Command(BaseCommand):
+    """Создание уменьшенных копий картинок для существующих рецептов."""
+    help = 'Создание уменьшенных копий картинок рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Пересоздать копии и для обработанных.')
+        parser.add_argument('--batch-size', type=int, default=50,
+                            help='Число картинок в одной пачке.')
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='').order_by('id')
+        if not options['all']:
+            recipes = recipes.filter(thumbnails={})
+        batch = []
+        done = 0
+        for recipe_id, image_name in recipes.values_list(
+            'id', 'image'
+        ).iterator():
+            batch.append((recipe_id, image_name))
+            if len(batch) >= options['batch_size']:
+                done += self.process(batch)
+                batch = []
+        done += self.process(batch)
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано картинок: {done}.'
+        ))
+
+    def process(self, batch):
+        """Обрабатывает пачку картинок в пуле процессов."""
+        found = []
+        originals = []
+        for recipe_id, image_name in batch:
+            if not default_storage.exists(image_name):
+                self.stderr.write(f'Нет файла картинки: {image_name}')
+                continue
+            with default_storage.open(image_name) as file:
+                originals.append(file.read())
+            found.append((recipe_id, image_name))
+        mapper = map
+        if settings.THUMBNAIL_WORKERS:
+            mapper = get_executor().map
+        for (recipe_id, image_name), rendered in zip(
+            found, mapper(render_thumbnails, originals)
+        ):
+            save_thumbnails(recipe_id, image_name, rendered)
+        if found:
+            self.stdout.write(f'Обработано в пачке: {len(found)}')
+        return len(found)
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from recipes.counters import recount
+
+
+class Command(BaseCommand):
+    """Пересчет счетчиков избранного, покупок, рецептов и подписчиков."""
+    help = 'Пересчет денормализованных счетчиков'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            recount()
+        self.stdout.write(self.style.SUCCESS('Счетчики пересчитаны.'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from recipes.trending import refresh_trending
+
+
+class Command(BaseCommand):
+    """Обновление рейтинга рецептов для сортировки trending."""
+    help = 'Обновление рейтинга рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help='Пересчитать рейтинг по всем добавлениям.')
+
+    def handle(self, *args, **options):
+        updated = refresh_trending(full=options['full'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Обновлен рейтинг рецептов: {updated}.'
+        ))
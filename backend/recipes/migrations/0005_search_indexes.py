@@ -0,0 +1,54 @@
+# Generated by Django 3.2.15 on 2026-10-18 11:00
+
+from django.db import migrations
+
+TRIGRAM_INDEXES = (
+    ('recipes_recipe', 'name', 'recipe_name_trgm_idx'),
+    ('recipes_ingredient', 'name', 'ingredient_name_trgm_idx'),
+)
+SEARCH_VECTOR_INDEX = 'recipe_search_vector_idx'
+SEARCH_CONFIG = 'russian'
+
+
+def create_search_indexes(apps, schema_editor):
+    """Создает индексы поиска; только для PostgreSQL."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    from django.contrib.postgres.indexes import GinIndex
+    from django.contrib.postgres.search import SearchVector
+
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for table, column, name in TRIGRAM_INDEXES:
+        # Совпадает с выражением, которое Django строит для icontains.
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON {table} '
+            f'USING gin ((UPPER({column}::text)) gin_trgm_ops)'
+        )
+    # Выражение совпадает с recipes.models.recipe_search_vector
+    # на момент миграции; код моделей сюда не импортируется.
+    search_vector = (
+        SearchVector('name', weight='A', config=SEARCH_CONFIG)
+        + SearchVector('text', weight='B', config=SEARCH_CONFIG)
+    )
+    schema_editor.add_index(
+        apps.get_model('recipes', 'Recipe'),
+        GinIndex(search_vector, name=SEARCH_VECTOR_INDEX)
+    )
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for _, _, name in TRIGRAM_INDEXES + ((None, None, SEARCH_VECTOR_INDEX),):
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_recipe_updated_shoppingcart_added'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 3.2.15 on 2026-10-18 06:04
+
+import django.core.validators
+from django.db import migrations, models
+
+CONVERSIONS = (
+    ('мг', 'г', 0.001),
+    ('кг', 'г', 1000),
+    ('л', 'мл', 1000),
+)
+
+
+def create_conversions(apps, schema_editor):
+    """Заводит переводы метрических единиц массы и объема."""
+    UnitConversion = apps.get_model('recipes', 'UnitConversion')
+    UnitConversion.objects.bulk_create(
+        UnitConversion(unit=unit, base_unit=base_unit, factor=factor)
+        for unit, base_unit, factor in CONVERSIONS
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_feed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UnitConversion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('unit', models.CharField(max_length=40, unique=True, verbose_name='Единица измерения')),
+                ('base_unit', models.CharField(max_length=40, verbose_name='Базовая единица')),
+                ('factor', models.FloatField(validators=[django.core.validators.MinValueValidator(0)], verbose_name='Множитель')),
+                ('updated', models.DateTimeField(auto_now=True, verbose_name='Дата изменения')),
+            ],
+            options={
+                'verbose_name': 'Перевод единиц измерения',
+                'verbose_name_plural': 'Переводы единиц измерения',
+                'ordering': ('base_unit', 'factor'),
+            },
+        ),
+        migrations.AddField(
+            model_name='shoppingcart',
+            name='servings',
+            field=models.PositiveSmallIntegerField(default=1, validators=[django.core.validators.MinValueValidator(1, message='Введите число порций больше 0.'), django.core.validators.MaxValueValidator(100, message='Число порций не больше 100.')], verbose_name='Порций'),
+        ),
+        migrations.AddField(
+            model_name='shoppingcart',
+            name='updated',
+            field=models.DateTimeField(auto_now=True, verbose_name='Дата изменения'),
+        ),
+        migrations.RunPython(create_conversions, migrations.RunPython.noop),
+    ]
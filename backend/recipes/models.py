@@ -1,12 +1,41 @@
-from django.db import models
-from django.core.validators import MinValueValidator
+from django.conf import settings
+from django.db import connections, models
+from django.db.models import (
+    BooleanField, Case, Exists, F, FloatField,
+    OuterRef, Prefetch, Q, Value, When, Window
+)
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import RowNumber
+from django.core.validators import MaxValueValidator, MinValueValidator
 
-from users.models import User
+from users.models import Follow, User
 from recipes.validators import validate_time
 
 MAX_LEN_FIELD = 200
 MAX_LEN_COLOR = 7
 MAX_LEN_MEASUREMENT = 40
+MAX_SERVINGS = 100
+SEARCH_CONFIG = 'russian'
+RECIPE_ORDERINGS = {
+    'popular': ('-favorites_count', '-id'),
+    'newest': ('-id',),
+    'quickest': ('cooking_time', '-id'),
+    'trending': ('-score__trending', '-id'),
+}
+
+
+def recipe_search_vector():
+    """Поисковый вектор рецепта для PostgreSQL.
+
+    То же выражение повторено в GIN-индексе миграции 0005, поэтому
+    его нельзя менять без новой миграции.
+    """
+    from django.contrib.postgres.search import SearchVector
+
+    return (
+        SearchVector('name', weight='A', config=SEARCH_CONFIG)
+        + SearchVector('text', weight='B', config=SEARCH_CONFIG)
+    )
 
 
 class Tag(models.Model):
@@ -53,11 +82,153 @@ class Ingredient(models.Model):
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
         ordering = ('name', )
+        constraints = (
+            models.UniqueConstraint(
+                fields=('name', 'measurement_unit'),
+                name='unique_ingredient_name_unit'
+            ),
+        )
 
     def __str__(self):
         return f'{self.name}: {self.measurement_unit}'
 
 
+class RecipeQuerySet(models.QuerySet):
+    """Набор запросов для рецептов."""
+
+    def with_related(self):
+        """Подгружает автора, тэги и ингредиенты фиксированным
+        числом запросов."""
+        return self.select_related('author').prefetch_related(
+            'tags',
+            Prefetch(
+                'amount_ingredient',
+                queryset=AmountIngredients.objects.select_related(
+                    'ingredients'
+                )
+            )
+        )
+
+    def with_user_flags(self, user):
+        """Аннотирует признаки избранного, списка покупок
+        и подписки на автора для пользователя."""
+        if user.is_anonymous:
+            false = Value(False, output_field=BooleanField())
+            return self.annotate(
+                is_favorited=false,
+                is_in_shopping_cart=false,
+                author_is_subscribed=false,
+            )
+        return self.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+            author_is_subscribed=Exists(Follow.objects.filter(
+                user=user, author=OuterRef('author')
+            )),
+        )
+
+    def latest_by_author(self, author_ids, limit):
+        """Последние limit рецептов каждого из авторов одним запросом."""
+        if not author_ids:
+            return self.none()
+        ranked = Recipe.objects.filter(author_id__in=author_ids).annotate(
+            author_rank=Window(
+                expression=RowNumber(),
+                partition_by=F('author'),
+                order_by=F('id').desc()
+            )
+        ).order_by().values('id', 'author_rank')
+        sql, params = ranked.query.sql_with_params()
+        return self.filter(id__in=RawSQL(
+            f'SELECT id FROM ({sql}) ranked WHERE author_rank <= %s',
+            (*params, limit)
+        ))
+
+    def search(self, query):
+        """Ищет рецепты по названию, описанию и ингредиентам
+        и сортирует по релевантности."""
+        engine = settings.RECIPE_SEARCH_ENGINE
+        if engine == 'auto':
+            engine = connections[self.db].vendor
+        if engine in ('postgres', 'postgresql'):
+            return self._search_postgres(query)
+        return self.annotate(
+            in_ingredients=Exists(AmountIngredients.objects.filter(
+                recipe=OuterRef('pk'),
+                ingredients__name__icontains=query
+            )),
+            rank=Case(
+                When(name__icontains=query, then=Value(1.0)),
+                When(text__icontains=query, then=Value(0.5)),
+                default=Value(0.1),
+                output_field=FloatField()
+            )
+        ).filter(
+            Q(name__icontains=query)
+            | Q(text__icontains=query)
+            | Q(in_ingredients=True)
+        ).order_by('-rank', '-id')
+
+    def feed_for(self, user):
+        """Рецепты авторов, на которых подписан пользователь.
+
+        Рецепты обычных авторов берутся из ленты FeedEntry, рецепты
+        авторов с FEED_CELEBRITY_FOLLOWERS подписчиков и больше в ленты
+        не раскладываются и выбираются по подпискам при чтении.
+        """
+        celebrity_ids = list(Follow.objects.filter(
+            user=user,
+            author__followers_count__gte=settings.FEED_CELEBRITY_FOLLOWERS
+        ).values_list('author_id', flat=True))
+        if not celebrity_ids:
+            return self.filter(feed_entries__user=user)
+        return self.filter(
+            Q(id__in=FeedEntry.objects.filter(user=user).values('recipe_id'))
+            | Q(author_id__in=celebrity_ids)
+        )
+
+    def sort_by(self, mode):
+        """Сортирует рецепты по одному из режимов RECIPE_ORDERINGS."""
+        if mode == 'trending':
+            self = self.filter(score__isnull=False)
+        return self.order_by(*RECIPE_ORDERINGS[mode])
+
+    def _search_postgres(self, query):
+        """Полнотекстовый поиск и поиск по триграммам в PostgreSQL.
+
+        Кандидаты собираются объединением трех выборок, каждая из
+        которых идет по своему индексу из миграции 0005, и только они
+        сортируются по релевантности. Условие через OR с коррелированным
+        подзапросом по ингредиентам вынуждало читать таблицу целиком.
+        """
+        from django.contrib.postgres.search import (
+            SearchQuery, SearchRank, TrigramSimilarity
+        )
+
+        search_query = SearchQuery(
+            query, config=SEARCH_CONFIG, search_type='websearch'
+        )
+        recipes = self.model.objects.order_by()
+        candidates = recipes.annotate(
+            search_vector=recipe_search_vector()
+        ).filter(search_vector=search_query).values('id').union(
+            recipes.filter(name__icontains=query).values('id'),
+            AmountIngredients.objects.filter(
+                ingredients__name__icontains=query
+            ).order_by().values('recipe_id')
+        )
+        return self.filter(id__in=candidates).annotate(
+            rank=(
+                SearchRank(recipe_search_vector(), search_query)
+                + TrigramSimilarity('name', query)
+            )
+        ).order_by('-rank', '-id')
+
+
 class Recipe(models.Model):
     """Модель рецептов."""
     author = models.ForeignKey(
@@ -88,16 +259,84 @@ class Recipe(models.Model):
         'Дата публикации',
         auto_now_add=True
     )
+    updated = models.DateTimeField(
+        'Дата изменения',
+        auto_now=True
+    )
+    favorites_count = models.PositiveIntegerField(
+        'В избранном',
+        default=0,
+        editable=False
+    )
+    cart_count = models.PositiveIntegerField(
+        'В списках покупок',
+        default=0,
+        editable=False
+    )
+    thumbnails = models.JSONField(
+        'Уменьшенные копии картинки',
+        default=dict,
+        blank=True,
+        editable=False
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         ordering = ['-id']
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = (
+            models.Index(
+                fields=('-favorites_count', '-id'),
+                name='recipe_popular_idx'
+            ),
+            models.Index(
+                fields=('cooking_time', '-id'),
+                name='recipe_quickest_idx'
+            ),
+        )
 
     def __str__(self):
         return f'{self.name}'
 
 
+class RecipeScore(models.Model):
+    """Предрассчитанный рейтинг рецепта для сортировки trending.
+
+    trending хранит log2 суммы 2 ** ((t - TRENDING_EPOCH) / полураспад)
+    по всем добавлениям в избранное и список покупок. Порядок по такому
+    значению совпадает с порядком по затухающему рейтингу в любой момент,
+    поэтому пересчитывать нужно только рецепты с новыми добавлениями.
+    """
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        verbose_name='Рецепт',
+        related_name='score'
+    )
+    trending = models.FloatField('Рейтинг', default=0)
+    updated = models.DateTimeField(
+        'Учтены добавления до',
+        null=True,
+        blank=True
+    )
+
+    class Meta:
+        verbose_name = 'Рейтинг рецепта'
+        verbose_name_plural = 'Рейтинги рецептов'
+        indexes = (
+            models.Index(
+                fields=('-trending', '-recipe'),
+                name='recipe_trending_idx'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.recipe} {self.trending:.2f}'
+
+
 class AmountIngredients(models.Model):
     """Модель, описывающая количество ингридиентов в рецепте."""
     recipe = models.ForeignKey(
@@ -141,10 +380,20 @@ class Favorite(models.Model):
         verbose_name='Рецепт',
         related_name='favorite'
     )
+    added = models.DateTimeField(
+        'Дата добавления',
+        auto_now_add=True
+    )
 
     class Meta:
         verbose_name = 'Избранный рецепт'
         verbose_name_plural = 'Избранные рецепты'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_favorite_user_recipe'
+            ),
+        )
 
 
 class ShoppingCart(models.Model):
@@ -161,7 +410,109 @@ class ShoppingCart(models.Model):
         verbose_name='Рецепт',
         related_name='shopping_cart'
     )
+    servings = models.PositiveSmallIntegerField(
+        'Порций',
+        default=1,
+        validators=(
+            MinValueValidator(1, message='Введите число порций больше 0.'),
+            MaxValueValidator(
+                MAX_SERVINGS,
+                message=f'Число порций не больше {MAX_SERVINGS}.'
+            ),
+        )
+    )
+    added = models.DateTimeField(
+        'Дата добавления',
+        auto_now_add=True
+    )
+    updated = models.DateTimeField(
+        'Дата изменения',
+        auto_now=True
+    )
 
     class Meta:
         verbose_name = 'Список покупок'
         verbose_name_plural = 'Список покупок'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_shopping_cart_user_recipe'
+            ),
+        )
+
+
+class UnitConversion(models.Model):
+    """Перевод единицы измерения в базовую: кг в г, л в мл.
+
+    Количество в base_unit равно количеству в unit, умноженному на factor.
+    """
+    unit = models.CharField(
+        'Единица измерения',
+        max_length=MAX_LEN_MEASUREMENT,
+        unique=True
+    )
+    base_unit = models.CharField(
+        'Базовая единица',
+        max_length=MAX_LEN_MEASUREMENT
+    )
+    factor = models.FloatField(
+        'Множитель',
+        validators=(MinValueValidator(0),)
+    )
+    updated = models.DateTimeField(
+        'Дата изменения',
+        auto_now=True
+    )
+
+    class Meta:
+        ordering = ('base_unit', 'factor')
+        verbose_name = 'Перевод единиц измерения'
+        verbose_name_plural = 'Переводы единиц измерения'
+
+    def __str__(self):
+        return f'1 {self.unit} = {self.factor:g} {self.base_unit}'
+
+
+class FeedEntry(models.Model):
+    """Рецепт в ленте подписчика автора.
+
+    Записи создаются при публикации рецепта для всех подписчиков
+    автора, поэтому лента читается без обхода подписок.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Подписчик',
+        related_name='feed_entries'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        verbose_name='Рецепт',
+        related_name='feed_entries'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Автор рецепта',
+        related_name='+'
+    )
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_feed_user_recipe'
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('user', 'author'),
+                name='feed_user_author_idx'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.user}: {self.recipe}'
@@ -0,0 +1,86 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from recipes.cache import INGREDIENTS_VERSION, TAGS_VERSION, bump_version
+from recipes.counters import shift_counter, shift_recipe_counter
+from recipes.feed import (
+    add_author, follower_lost, remove_author, schedule_fan_out
+)
+from recipes.models import (
+    Favorite, Ingredient, Recipe, RecipeScore, ShoppingCart, Tag
+)
+from users.models import Follow, User
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def ingredients_changed(**kwargs):
+    """Сбрасывает индекс и кэш ингредиентов."""
+    bump_version(INGREDIENTS_VERSION)
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def tags_changed(**kwargs):
+    """Сбрасывает кэш тэгов."""
+    bump_version(TAGS_VERSION)
+
+
+def delta_of(signal, created):
+    """Возвращает изменение счетчика для сигнала или None."""
+    if signal is post_delete:
+        return -1
+    return 1 if created else None
+
+
+@receiver((post_save, post_delete), sender=Favorite)
+@receiver((post_save, post_delete), sender=ShoppingCart)
+def recipe_list_changed(sender, instance, signal, created=False, **kwargs):
+    """Обновляет счетчики избранного и списка покупок у рецепта."""
+    delta = delta_of(signal, created)
+    if delta:
+        shift_recipe_counter(sender, [instance.recipe_id], delta)
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def recipe_changed(instance, signal, created=False, **kwargs):
+    """Обновляет счетчик рецептов автора."""
+    delta = delta_of(signal, created)
+    if delta:
+        shift_counter(
+            User.objects.filter(id=instance.author_id),
+            'recipes_count',
+            delta
+        )
+
+
+@receiver((post_save, post_delete), sender=Follow)
+def follow_changed(instance, signal, created=False, **kwargs):
+    """Обновляет счетчик подписчиков автора."""
+    delta = delta_of(signal, created)
+    if delta:
+        shift_counter(
+            User.objects.filter(id=instance.author_id),
+            'followers_count',
+            delta
+        )
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_created(instance, created, **kwargs):
+    """Заводит строку рейтинга, чтобы рецепт попадал в сортировку,
+    и раскладывает рецепт по лентам подписчиков."""
+    if created:
+        RecipeScore.objects.create(recipe=instance)
+        schedule_fan_out(instance)
+
+
+@receiver((post_save, post_delete), sender=Follow)
+def feed_follow_changed(instance, signal, created=False, **kwargs):
+    """Добавляет рецепты автора в ленту при подписке
+    и убирает при отписке; автору, который после отписки перестал
+    быть знаменитостью, раскладывает рецепты по лентам подписчиков."""
+    delta = delta_of(signal, created)
+    if delta == 1:
+        add_author(instance.user_id, instance.author_id)
+    elif delta == -1:
+        remove_author(instance.user_id, instance.author_id)
+        follower_lost(instance.author_id)
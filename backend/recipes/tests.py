@@ -0,0 +1,39 @@
+from django.test import TestCase, override_settings
+
+from recipes.models import FeedEntry, Recipe
+from users.models import Follow, User
+
+
+@override_settings(FEED_CELEBRITY_FOLLOWERS=2)
+class FeedTests(TestCase):
+    """Лента рецептов авторов из подписок."""
+
+    def setUp(self):
+        self.author, self.reader, self.other = (
+            User.objects.create_user(
+                username=name, email=f'{name}@example.com',
+                password='Sup3r-secret-pass',
+                first_name=name, last_name=name
+            )
+            for name in ('author', 'reader', 'other')
+        )
+
+    def create_recipe(self):
+        return Recipe.objects.create(
+            author=self.author, name='Суп', text='Сварить',
+            image='recipes/images/soup.jpg', cooking_time=10
+        )
+
+    def test_recipes_of_former_celebrity_stay_in_feed(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        follow = Follow.objects.create(user=self.other, author=self.author)
+        # Рецепт знаменитости не раскладывается по лентам.
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe = self.create_recipe()
+        self.assertFalse(FeedEntry.objects.exists())
+        self.assertIn(recipe, Recipe.objects.feed_for(self.reader))
+        follow.delete()
+        self.assertTrue(FeedEntry.objects.filter(
+            user=self.reader, recipe=recipe
+        ).exists())
+        self.assertIn(recipe, Recipe.objects.feed_for(self.reader))
@@ -0,0 +1,165 @@
+import io
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import PurePosixPath
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_SIZES = {
+    'list': 320,
+    'card': 640,
+    'detail': 1280,
+}
+THUMBNAIL_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+THUMBNAIL_DIR = 'thumbnails'
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def render_thumbnails(original):
+    """Готовит уменьшенные копии картинки во всех размерах и форматах.
+
+    Выполняется в отдельном процессе, поэтому принимает и возвращает
+    только байты: {размер: {'width': ширина, формат: байты}}.
+    """
+    with Image.open(io.BytesIO(original)) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.mode else 'RGB')
+        result = {}
+        for size, width in THUMBNAIL_SIZES.items():
+            copy = image.copy()
+            copy.thumbnail((width, width), Image.LANCZOS)
+            result[size] = {'width': copy.width}
+            for name, (image_format, options) in THUMBNAIL_FORMATS.items():
+                frame = copy
+                if image_format == 'JPEG' and frame.mode != 'RGB':
+                    frame = frame.convert('RGB')
+                buffer = io.BytesIO()
+                frame.save(buffer, image_format, **options)
+                result[size][name] = buffer.getvalue()
+        return result
+
+
+def save_thumbnails(recipe_id, image_name, rendered):
+    """Сохраняет копии в хранилище и записывает их в рецепт.
+
+    Если картинку рецепта успели заменить, результат выбрасывается.
+    """
+    from recipes.models import Recipe
+
+    stem = PurePosixPath(image_name).stem
+    thumbnails = {}
+    for size, files in rendered.items():
+        thumbnails[size] = {'width': files.pop('width')}
+        for name, content in files.items():
+            thumbnails[size][name] = default_storage.save(
+                f'{THUMBNAIL_DIR}/{stem}-{size}.{name}',
+                ContentFile(content)
+            )
+    previous = Recipe.objects.filter(
+        pk=recipe_id, image=image_name
+    ).values_list('thumbnails', flat=True).first()
+    updated = Recipe.objects.filter(pk=recipe_id, image=image_name).update(
+        thumbnails=thumbnails
+    )
+    delete_thumbnails(previous if updated else thumbnails)
+
+
+def delete_thumbnails(thumbnails):
+    """Удаляет файлы уменьшенных копий."""
+    for files in (thumbnails or {}).values():
+        for name, value in files.items():
+            if name in THUMBNAIL_FORMATS:
+                default_storage.delete(value)
+
+
+def get_executor():
+    """Пул процессов для обработки картинок, создается при первом вызове."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS
+            )
+        return _executor
+
+
+def make_thumbnails(recipe_id, image_name):
+    """Готовит и сохраняет копии картинки рецепта в текущем потоке."""
+    with default_storage.open(image_name) as file:
+        original = file.read()
+    save_thumbnails(recipe_id, image_name, render_thumbnails(original))
+
+
+def _on_rendered(recipe_id, image_name, future):
+    """Сохраняет результат фоновой обработки."""
+    close_old_connections()
+    try:
+        save_thumbnails(recipe_id, image_name, future.result())
+    except Exception:
+        logger.exception('Не удалось обработать картинку %s', image_name)
+    finally:
+        close_old_connections()
+
+
+def submit_thumbnails(recipe_id, image_name):
+    """Отправляет картинку в пул процессов или обрабатывает сразу."""
+    if not settings.THUMBNAIL_WORKERS:
+        make_thumbnails(recipe_id, image_name)
+        return
+    with default_storage.open(image_name) as file:
+        original = file.read()
+    future = get_executor().submit(render_thumbnails, original)
+    future.add_done_callback(
+        lambda done: _on_rendered(recipe_id, image_name, done)
+    )
+
+
+def schedule_thumbnails(recipe):
+    """Ставит обработку картинки рецепта после фиксации транзакции."""
+    if not recipe.image:
+        return
+    recipe_id, image_name = recipe.pk, recipe.image.name
+    transaction.on_commit(
+        lambda: submit_thumbnails(recipe_id, image_name)
+    )
+
+
+def thumbnail_urls(thumbnails, build_url=None):
+    """Ссылки на копии: {размер: {'width': ширина, формат: ссылка}}."""
+    build_url = build_url or default_storage.url
+    return {
+        size: {
+            name: build_url(value) if name in THUMBNAIL_FORMATS else value
+            for name, value in files.items()
+        }
+        for size, files in (thumbnails or {}).items()
+    }
+
+
+def srcset(thumbnails, build_url=None):
+    """Значения атрибута srcset для каждого формата."""
+    build_url = build_url or default_storage.url
+    ordered = sorted(
+        (thumbnails or {}).values(), key=lambda files: files['width']
+    )
+    return {
+        name: ', '.join(
+            f'{build_url(files[name])} {files["width"]}w'
+            for files in ordered
+        )
+        for name in THUMBNAIL_FORMATS
+        if ordered
+    }
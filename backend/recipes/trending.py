@@ -0,0 +1,89 @@
+import math
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from recipes.models import Favorite, Recipe, RecipeScore, ShoppingCart
+
+TRENDING_EPOCH = datetime(2020, 1, 1, tzinfo=dt_timezone.utc)
+TRENDING_SOURCES = (Favorite, ShoppingCart)
+BATCH_SIZE = 1000
+
+
+def add_log2(first, second):
+    """Возвращает log2(2 ** first + 2 ** second) без переполнения."""
+    if first is None:
+        return second
+    high, low = max(first, second), min(first, second)
+    return high + math.log2(1 + 2 ** (low - high))
+
+
+def event_weight(added):
+    """Вклад добавления в момент added в log2-шкале."""
+    half_life = settings.TRENDING_HALF_LIFE_HOURS * 3600
+    return (added - TRENDING_EPOCH).total_seconds() / half_life
+
+
+def collect(since, until):
+    """Суммирует вклады добавлений из (since, until] по рецептам."""
+    scores = {}
+    for model in TRENDING_SOURCES:
+        events = model.objects.filter(added__lte=until)
+        if since is not None:
+            events = events.filter(added__gt=since)
+        for recipe_id, added in events.values_list(
+            'recipe_id', 'added'
+        ).iterator():
+            scores[recipe_id] = add_log2(
+                scores.get(recipe_id), event_weight(added)
+            )
+    return scores
+
+
+def refresh_trending(full=False):
+    """Обновляет рейтинги и возвращает число рецептов с добавлениями.
+
+    По умолчанию учитывает только добавления после прошлого запуска,
+    полный пересчет нужен после смены TRENDING_HALF_LIFE_HOURS и чтобы
+    учесть удаления из избранного и списков покупок.
+    """
+    until = timezone.now()
+    with transaction.atomic():
+        since = None
+        if not full:
+            since = RecipeScore.objects.aggregate(
+                last=Max('updated')
+            )['last']
+        scores = collect(since, until)
+        existing = RecipeScore.objects.none()
+        if since is not None:
+            existing = RecipeScore.objects.filter(recipe_id__in=scores)
+        changed = []
+        for score in existing.iterator():
+            score.trending = add_log2(score.trending, scores[score.pk])
+            score.updated = until
+            changed.append(score)
+        RecipeScore.objects.bulk_update(
+            changed, ('trending', 'updated'), batch_size=BATCH_SIZE
+        )
+        if since is None:
+            RecipeScore.objects.all().delete()
+        known = {score.pk for score in changed}
+        RecipeScore.objects.bulk_create(
+            (
+                RecipeScore(
+                    recipe_id=recipe_id,
+                    trending=scores.get(recipe_id, 0),
+                    updated=until if recipe_id in scores else None
+                )
+                for recipe_id in Recipe.objects.exclude(
+                    score__isnull=False
+                ).values_list('id', flat=True).iterator()
+                if recipe_id not in known
+            ),
+            batch_size=BATCH_SIZE
+        )
+    return len(scores)
@@ -1,3 +1,5 @@
+from django.conf import settings
+from PIL import Image
 from rest_framework.validators import ValidationError
 
 COOKING_TIME = 1
@@ -25,7 +27,7 @@ def validate_ingredients(data):
             raise ValidationError(
                 ['Отсутствует id ингредиента.']
             )
-        id = ingredient.get('id')
+        id = int(ingredient.get('id'))
         if id in unique_ingredient:
             raise ValidationError(
                 ['Нельзя использовать один и тот же ингредиент несколько раз']
@@ -37,3 +39,32 @@ def validate_ingredients(data):
                 ['Количество не может быть менее 1.']
             )
     return data
+
+
+def validate_image_size(size):
+    """Валидация размера файла картинки в байтах."""
+    limit = settings.RECIPE_IMAGE_MAX_SIZE
+    if size > limit:
+        raise ValidationError(
+            [f'Картинка не может быть больше {limit // 1024} КБ.']
+        )
+
+
+def validate_image_dimensions(file):
+    """Валидация ширины и высоты картинки по заголовку файла,
+    без декодирования изображения. Возвращает формат картинки."""
+    limit = settings.RECIPE_IMAGE_MAX_DIMENSION
+    position = file.tell()
+    try:
+        with Image.open(file) as image:
+            width, height = image.size
+            image_format = (image.format or '').lower()
+    except (OSError, Image.DecompressionBombError):
+        raise ValidationError(['Загрузите корректную картинку.'])
+    finally:
+        file.seek(position)
+    if max(width, height) > limit:
+        raise ValidationError(
+            [f'Картинка не может быть больше {limit}px по стороне.']
+        )
+    return image_format
@@ -12,8 +12,11 @@ class PersonAdmin(admin.ModelAdmin):
         'first_name',
         'last_name',
         'email',
-        'password'
+        'password',
+        'recipes_count',
+        'followers_count'
     )
+    readonly_fields = ('recipes_count', 'followers_count')
     list_filter = (
         'first_name',
         'email',